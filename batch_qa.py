@@ -0,0 +1,88 @@
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import design_qa
+from sample_questions import SAMPLE_QUESTIONS
+
+
+def load_questions(path):
+    """Read questions as [{"question", "level"}] from .txt, .json or .jsonl.
+
+    .txt holds one question per line; .json is either a list of questions or a
+    {level: [questions]} mapping like SAMPLE_QUESTIONS; .jsonl has one
+    {"question": ..., "level": ...} object per line.
+    """
+    with open(path, "r") as f:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+            return [{"question": row["question"], "level": row.get("level")} for row in rows]
+        if path.endswith(".json"):
+            return flatten_questions(json.load(f))
+        return [{"question": line.strip(), "level": None} for line in f if line.strip()]
+
+
+def flatten_questions(data):
+    if isinstance(data, dict):
+        return [{"question": q, "level": level} for level, questions in data.items() for q in questions]
+    return [{"question": q, "level": None} if isinstance(q, str) else q for q in data]
+
+
+def run_batch(questions, output_path, workers=4):
+    """Run every question through design_qa.run_query on a pool and append results as JSONL."""
+    write_lock = threading.Lock()
+    started = time.perf_counter()
+    failures = 0
+    latencies = {"cold": [], "warm": []}
+
+    def run_one(idx, item):
+        try:
+            result = design_qa.run_query(item["question"])
+        except Exception as e:
+            result = {"query": item["question"], "answer": None, "error": str(e)}
+        result.update({"index": idx, "level": item.get("level")})
+        return result
+
+    with open(output_path, "w") as out, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_one, idx, item) for idx, item in enumerate(questions)]
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            failures += 1 if result.get("error") else 0
+            temperature = "cold" if result.get("cold") else "warm"
+            if result.get("total_seconds") is not None:
+                latencies[temperature].append(result["total_seconds"])
+            with write_lock:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+            print(f"[{done}/{len(questions)}] {result.get('total_seconds') or 0:.2f}s {temperature} {result['query'][:70]}")
+
+    elapsed = time.perf_counter() - started
+    print(f"Answered {len(questions)} questions in {elapsed:.1f}s with {workers} workers "
+          f"({failures} failures). Results written to {output_path}.")
+    for temperature, seconds in latencies.items():
+        if seconds:
+            print(f"{temperature.capitalize()} queries: {len(seconds)}, mean {sum(seconds) / len(seconds):.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Verilog Q&A questions headlessly and write JSONL results.")
+    parser.add_argument("questions", nargs="?", help="Question file (.txt, .json or .jsonl). Defaults to the sample questions.")
+    parser.add_argument("-o", "--output", default="qa_results.jsonl")
+    parser.add_argument("-w", "--workers", type=int, default=4)
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log pipeline progress for every question.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(threadName)s %(levelname)s %(message)s")
+    questions = load_questions(args.questions) if args.questions else flatten_questions(SAMPLE_QUESTIONS)
+    if not questions:
+        sys.exit("No questions to run.")
+    run_batch(questions, args.output, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+from array import array
+from contextlib import contextmanager
+
+# Chunk JSON files the store is usually built from
+DEFAULT_SOURCES = [
+    "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/cleaned/cleaned_verilog_chunks.json",
+    "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/verilog_chunks_langchain.json",
+]
+
+
+def iter_json_array(path, read_size=1 << 16):
+    """Yield the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, "r") as f:
+        buffer = f.read(read_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} does not contain a JSON array")
+        pos = 1
+        eof = False
+        while True:
+            # Skip separators between elements, reading more when the buffer runs dry
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buffer):
+                if eof:
+                    raise ValueError(f"{path} ended before the closing ]")
+                more = f.read(read_size)
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            if buffer[pos] == "]":
+                return
+
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+                # A value that ends exactly at the buffer edge may be cut short (e.g. a number)
+                complete = end < len(buffer) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                more = f.read(read_size)
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+
+            yield element
+            pos = end
+            if pos > read_size:
+                buffer, pos = buffer[pos:], 0
+
+
+def store_paths(base_path):
+    """(index, blob) file paths of the store rooted at base_path."""
+    return base_path + ".sqlite3", base_path + ".bin"
+
+
+def default_store_path(json_path):
+    """Store base path next to a chunk JSON file: x.json -> x.chunks"""
+    return os.path.splitext(json_path)[0] + ".chunks"
+
+
+def convert_json(json_path, base_path=None, model="gpt-4o-mini", batch_size=512, workers=8):
+    """Build a chunk store from a chunk JSON file ([{file_name, file_path, chunks}]).
+
+    Chunk text is appended to a flat UTF-8 blob; the SQLite index records each
+    chunk's file, byte offset, length, token count and hash. Both files are
+    written next to their final names and swapped in once complete.
+    """
+    # Only conversion needs the tokenizer; readers (file_router, ...) stay free of tiktoken
+    import context_packer
+
+    base_path = base_path or default_store_path(json_path)
+    index_path, blob_path = store_paths(base_path)
+    encoding = context_packer.get_encoding(model)
+    for path in (index_path + ".tmp", blob_path + ".tmp"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    conn = sqlite3.connect(index_path + ".tmp")
+    try:
+        conn.executescript(
+            "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);"
+            "CREATE TABLE files ("
+            " id INTEGER PRIMARY KEY, file_name TEXT NOT NULL, file_path TEXT NOT NULL UNIQUE,"
+            " first_chunk INTEGER NOT NULL, chunk_count INTEGER NOT NULL, tokens INTEGER NOT NULL);"
+            "CREATE TABLE chunks ("
+            " id INTEGER PRIMARY KEY, file_id INTEGER NOT NULL, seq INTEGER NOT NULL,"
+            " offset INTEGER NOT NULL, length INTEGER NOT NULL, tokens INTEGER NOT NULL, hash TEXT NOT NULL,"
+            " start_line INTEGER, end_line INTEGER, kind TEXT);"
+        )
+        offset = 0
+        chunk_id = 0
+        with open(blob_path + ".tmp", "wb") as blob:
+            for file_id, record in enumerate(iter_json_array(json_path)):
+                encoded = [chunk.encode("utf-8") for chunk in record['chunks']]
+                tokens = []
+                for start in range(0, len(encoded), batch_size):
+                    batch = record['chunks'][start:start + batch_size]
+                    tokens += [len(t) for t in encoding.encode_batch(batch, num_threads=workers)]
+                # Syntax-aware chunk files (verilog_chunker.py) also carry source line ranges
+                line_ranges = record.get('chunk_lines') or [[None, None]] * len(encoded)
+                kinds = record.get('chunk_kinds') or [None] * len(encoded)
+                rows = []
+                for seq, (data, count) in enumerate(zip(encoded, tokens)):
+                    blob.write(data)
+                    rows.append((chunk_id + seq, file_id, seq, offset, len(data), count,
+                                 hashlib.sha1(data).hexdigest(), line_ranges[seq][0], line_ranges[seq][1], kinds[seq]))
+                    offset += len(data)
+                conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                             (file_id, record['file_name'], record['file_path'], chunk_id, len(rows), sum(tokens)))
+                chunk_id += len(rows)
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("source", os.path.abspath(json_path)),
+            ("encoding", encoding.name),
+            ("blob_bytes", str(offset)),
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(blob_path + ".tmp", blob_path)
+    os.replace(index_path + ".tmp", index_path)
+    return base_path
+
+
+class ChunkStore:
+    """Read-only view of a converted chunk corpus.
+
+    The per-chunk offsets, lengths and token counts are loaded into flat arrays
+    when the store opens, so lookups by chunk id or file path are O(1). Chunk
+    text is sliced out of the memory-mapped blob, so only pages that are
+    actually read are brought into memory.
+    """
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.index_path, self.blob_path = store_paths(base_path)
+        if not os.path.exists(self.index_path) or not os.path.exists(self.blob_path):
+            raise FileNotFoundError(f"No chunk store at {base_path}")
+
+        with self._connect() as conn:
+            self.meta = dict(conn.execute("SELECT key, value FROM meta"))
+            self.files = {}
+            for file_id, file_name, file_path, first, count, tokens in conn.execute(
+                    "SELECT id, file_name, file_path, first_chunk, chunk_count, tokens FROM files ORDER BY id"):
+                self.files[file_path] = {"file_id": file_id, "file_name": file_name, "first_chunk": first,
+                                         "chunk_count": count, "tokens": tokens}
+            self.offsets, self.lengths, self.tokens, self.file_ids = array("q"), array("q"), array("q"), array("q")
+            # 0 when the source JSON had no line ranges
+            self.start_lines, self.end_lines = array("q"), array("q")
+            for file_id, offset, length, tokens, start_line, end_line in conn.execute(
+                    "SELECT file_id, offset, length, tokens, start_line, end_line FROM chunks ORDER BY id"):
+                self.file_ids.append(file_id)
+                self.offsets.append(offset)
+                self.lengths.append(length)
+                self.tokens.append(tokens)
+                self.start_lines.append(start_line or 0)
+                self.end_lines.append(end_line or 0)
+        self.paths_by_id = {info["file_id"]: path for path, info in self.files.items()}
+
+        self._blob = open(self.blob_path, "rb")
+        # mmap cannot map an empty file
+        self._mmap = mmap.mmap(self._blob.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(self.blob_path) else b""
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._blob.close()
+
+    def chunk_text(self, chunk_id):
+        offset = self.offsets[chunk_id]
+        return self._mmap[offset:offset + self.lengths[chunk_id]].decode("utf-8")
+
+    def chunk(self, chunk_id):
+        """Chunk text with its file path, position in the file, source lines (None if unknown) and token count."""
+        file_path = self.paths_by_id[self.file_ids[chunk_id]]
+        return {
+            "chunk_id": chunk_id,
+            "file_path": file_path,
+            "seq": chunk_id - self.files[file_path]["first_chunk"],
+            "start_line": self.start_lines[chunk_id] or None,
+            "end_line": self.end_lines[chunk_id] or None,
+            "tokens": self.tokens[chunk_id],
+            "text": self.chunk_text(chunk_id),
+        }
+
+    def chunk_ids(self, file_path):
+        info = self.files.get(file_path)
+        if info is None:
+            return range(0)
+        return range(info["first_chunk"], info["first_chunk"] + info["chunk_count"])
+
+    def file_chunks(self, file_path):
+        """Chunk texts of one file, in order."""
+        return [self.chunk_text(chunk_id) for chunk_id in self.chunk_ids(file_path)]
+
+    def file_text(self, file_path, separator=" "):
+        """All chunks of a file joined; one contiguous slice since a file's chunks are stored together."""
+        ids = self.chunk_ids(file_path)
+        if not ids:
+            return ""
+        if separator == "":
+            start = self.offsets[ids[0]]
+            return self._mmap[start:self.offsets[ids[-1]] + self.lengths[ids[-1]]].decode("utf-8")
+        return separator.join(self.file_chunks(file_path))
+
+    def file_tokens(self, file_path):
+        info = self.files.get(file_path)
+        return info["tokens"] if info else 0
+
+
+def open_store_for(json_path):
+    """ChunkStore converted from json_path, or None when it is missing or older than the JSON."""
+    base_path = default_store_path(json_path)
+    index_path, blob_path = store_paths(base_path)
+    try:
+        if os.path.getmtime(index_path) < os.path.getmtime(json_path):
+            return None
+        return ChunkStore(base_path)
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert chunk JSON files into memory-mapped chunk stores.")
+    parser.add_argument("sources", nargs="*", default=DEFAULT_SOURCES, help="Chunk JSON files to convert.")
+    parser.add_argument("--model", default="gpt-4o-mini", help="Tokenizer used for the stored token counts.")
+    args = parser.parse_args()
+
+    for json_path in args.sources:
+        base_path = convert_json(json_path, model=args.model)
+        store = ChunkStore(base_path)
+        print(f"{json_path}: {len(store.files)} files, {len(store)} chunks, "
+              f"{sum(store.tokens)} tokens -> {base_path}.sqlite3 / .bin")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
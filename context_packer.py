@@ -0,0 +1,142 @@
+import logging
+import math
+import os
+import re
+from collections import Counter
+
+import tiktoken
+
+import verilog_chunker
+from file_router import tokenize
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("VERILOG_QA_CONTEXT_TOKENS", "8000"))
+
+# Only offline tools whose token counts are informational (eval_retrieval.py) fall back to an estimate;
+# everything else fails rather than writing approximate counts
+ALLOW_APPROXIMATE_TOKENS = os.getenv("VERILOG_QA_APPROX_TOKENS", "").lower() in ("1", "true", "yes")
+_encodings = {}
+logger = logging.getLogger("verilog_qa.tokens")
+
+
+class ApproximateEncoding:
+    """Stand-in for a tiktoken encoding when its BPE file cannot be loaded (offline, no TIKTOKEN_CACHE_DIR).
+
+    Counts about 4 characters per token, the same estimate llm_client budgets with.
+    """
+
+    name = "approx-4-chars"
+
+    def encode(self, text):
+        return range((len(text) + 3) // 4)
+
+    def encode_batch(self, texts, num_threads=8):
+        return [self.encode(text) for text in texts]
+
+
+def get_encoding(model="gpt-4o-mini"):
+    """tiktoken encoding for the model, loaded once per process.
+
+    When it cannot be downloaded, raises unless ALLOW_APPROXIMATE_TOKENS is set,
+    in which case an ApproximateEncoding is used.
+    """
+    if model not in _encodings:
+        try:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            if not ALLOW_APPROXIMATE_TOKENS:
+                raise RuntimeError(f"Cannot load the {model} tokenizer ({e}). Point TIKTOKEN_CACHE_DIR at a cached "
+                                   f"copy, or set VERILOG_QA_APPROX_TOKENS=1 to count ~4 characters per token.") from e
+            logger.warning("Cannot load the %s tokenizer (%s); counting ~4 characters per token. "
+                           "Point TIKTOKEN_CACHE_DIR at a cached copy for exact counts.", model, e)
+            _encodings[model] = ApproximateEncoding()
+    return _encodings[model]
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    return len(get_encoding(model).encode(text))
+
+
+def split_into_chunks(content, target_lines=30, max_lines=60):
+    """Split Verilog source into line-addressed chunks on syntax boundaries, dropping the license banner.
+
+    Returns a list of (start_line, end_line, text), 1-based and inclusive.
+    """
+    _, chunks = verilog_chunker.chunk_source(content, target_lines, max_lines)
+    return [(chunk["start_line"], chunk["end_line"], chunk["text"]) for chunk in chunks]
+
+
+def score_chunks(query, chunks):
+    """BM25-style relevance of each chunk's text to the query terms."""
+    query_terms = set(tokenize(query))
+    chunk_terms = [Counter(tokenize(chunk["text"])) for chunk in chunks]
+    doc_freq = Counter(term for terms in chunk_terms for term in terms if term in query_terms)
+    avg_length = sum(sum(terms.values()) for terms in chunk_terms) / max(len(chunks), 1)
+
+    scores = []
+    for chunk, terms in zip(chunks, chunk_terms):
+        length = sum(terms.values())
+        score = 0.0
+        for term in query_terms:
+            freq = terms.get(term, 0)
+            if not freq:
+                continue
+            idf = math.log(1 + (len(chunks) - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            score += idf * freq * 2.5 / (freq + 1.5 * (0.25 + 0.75 * length / max(avg_length, 1)))
+        # Module headers carry the interface and help any question about the file
+        if re.search(r"^\s*module\s", chunk["text"], re.MULTILINE):
+            score += 1.0
+        # Earlier-ranked files get a small prior over later ones
+        score += 0.5 / (1 + chunk["file_rank"])
+        scores.append(score)
+    return scores
+
+
+def prepare_chunks(content, model="gpt-4o-mini"):
+    """Split content into chunk dicts (start_line, end_line, text) with their token counts, ready for pack_context."""
+    encoding = get_encoding(model)
+    return [
+        {"start_line": start_line, "end_line": end_line, "text": text,
+         "tokens": len(encoding.encode(text)) + 16}  # label overhead
+        for start_line, end_line, text in split_into_chunks(content)
+    ]
+
+
+def pack_context(query, file_contents, token_budget=DEFAULT_TOKEN_BUDGET, model="gpt-4o-mini", prepared=None):
+    """Fill token_budget with the highest-scoring chunks across all files.
+
+    file_contents is a list of (file_path, content) in routing order; prepared
+    optionally maps a file path to its prepare_chunks() output so files chunked
+    ahead of time are not split again. Returns (context_text, packed) where
+    packed lists the selected chunk dicts with file_path, start_line, end_line
+    and tokens.
+    """
+    prepared = prepared or {}
+    chunks = []
+    for file_rank, (file_path, content) in enumerate(file_contents):
+        file_chunks = prepared.get(file_path)
+        if file_chunks is None:
+            file_chunks = prepare_chunks(content, model)
+        # Copies: prepared chunks may be shared with other queries
+        chunks += [{**chunk, "file_path": file_path, "file_rank": file_rank} for chunk in file_chunks]
+    if not chunks:
+        return "", []
+
+    for chunk, score in zip(chunks, score_chunks(query, chunks)):
+        chunk["score"] = score
+
+    packed, used = [], 0
+    for chunk in sorted(chunks, key=lambda c: c["score"], reverse=True):
+        if used + chunk["tokens"] <= token_budget:
+            packed.append(chunk)
+            used += chunk["tokens"]
+
+    # Present the chunks in source order so each file reads top to bottom
+    packed.sort(key=lambda c: (c["file_rank"], c["start_line"]))
+    sections = [
+        f"File: {chunk['file_path']} (lines {chunk['start_line']}-{chunk['end_line']})\n{chunk['text']}"
+        for chunk in packed
+    ]
+    return "\n\n".join(sections), packed
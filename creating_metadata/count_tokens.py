@@ -1,43 +1,179 @@
+import argparse
+import hashlib
 import json
-import tiktoken
-
-# Load the JSON file containing the Verilog chunks
-with open('/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/cleaned/cleaned_verilog_chunks.json', 'r') as f:
-    data = json.load(f)
-
-# Initialize the tokenizer (this example assumes GPT-3 or similar tokenization)
-encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")  # Adjust model if needed
-
-def count_tokens_in_chunks(chunks):
-    """
-    Counts the total number of tokens in the given list of chunks.
-    """
-    total_tokens = 0
-    for chunk in chunks:
-        tokens = encoding.encode(chunk)
-        total_tokens += len(tokens)
-    return total_tokens
-
-# Iterate through all files and count tokens
-total_tokens_across_all_files = 0
-file_token_counts = {}
-
-for file in data:
-    file_name = file['file_name']
-    chunks = file['chunks']
-    
-    file_token_count = count_tokens_in_chunks(chunks)
-    file_token_counts[file_name] = file_token_count
-    total_tokens_across_all_files += file_token_count
-
-# Output the total token count and per file token count
-print(f"Total tokens across all Verilog files: {total_tokens_across_all_files}")
-print("Token counts per file:")
-for file_name, token_count in file_token_counts.items():
-    print(f"{file_name}: {token_count}")
-
-# Optionally, you could save the token counts to a file
-with open('/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/token_counts.json', 'w') as f:
-    json.dump(file_token_counts, f, indent=4)
-
-print("Token counts saved to token_counts.json.")
+import os
+import sys
+from collections import defaultdict
+
+# Shared helpers (tokenizer, cost rates, ...) live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import context_packer
+import tracing
+import create_metadata
+from chunk_store import iter_json_array
+
+# Paths for input and output files
+chunks_json_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/cleaned/cleaned_verilog_chunks.json"
+token_counts_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/token_counts.json"
+count_cache_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/token_count_cache.json"
+
+# Same model the README is generated with, so counts and costs match what is billed
+MODEL = "gpt-4o-mini"
+
+def chunk_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+# Function to load {chunk hash: token count}; counts from a different tokenizer are discarded
+def load_count_cache(path, encoding_name):
+    try:
+        with open(path, "r") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("encoding") != encoding_name:
+        print(f"Token count cache was built with {cache.get('encoding')}, recounting with {encoding_name}.")
+        return {}
+    return cache.get("counts", {})
+
+def save_count_cache(path, encoding_name, counts):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"encoding": encoding_name, "counts": counts}, f)
+    os.replace(path + ".tmp", path)
+
+# Function to count tokens for every file in a chunk JSON, only encoding chunks not in the cache
+# Uncached chunks are encoded in batches with tiktoken's threaded encode_batch
+def count_file_tokens(records, encoding, counts, workers=8, batch_size=512):
+    files = []
+    pending = {}
+    stats = {"chunks": 0, "reused": 0, "encoded": 0}
+
+    def flush():
+        hashes = list(pending)
+        for digest, tokens in zip(hashes, encoding.encode_batch([pending[h] for h in hashes], num_threads=workers)):
+            counts[digest] = len(tokens)
+        stats["encoded"] += len(hashes)
+        pending.clear()
+
+    for record in records:
+        hashes = []
+        for chunk in record['chunks']:
+            digest = chunk_hash(chunk)
+            hashes.append(digest)
+            stats["chunks"] += 1
+            if digest in counts or digest in pending:
+                continue
+            pending[digest] = chunk
+            if len(pending) >= batch_size:
+                flush()
+        # Keep only the hashes so memory stays flat however large the JSON is
+        files.append({"file_name": record['file_name'], "file_path": record['file_path'], "hashes": hashes})
+    if pending:
+        flush()
+    # Chunks answered by the cache or repeated elsewhere in the corpus
+    stats["reused"] = stats["chunks"] - stats["encoded"]
+
+    for file in files:
+        file["tokens"] = sum(counts[digest] for digest in file.pop("hashes"))
+    return files, stats
+
+# Function to total token counts per directory, relative to the common source root
+def summarize_by_directory(files):
+    paths = [file['file_path'] for file in files]
+    root = os.path.commonpath(paths) if len(paths) > 1 else os.path.dirname(paths[0]) if paths else ""
+    directories = defaultdict(int)
+    for file in files:
+        directories[os.path.relpath(os.path.dirname(file['file_path']), root)] += file['tokens']
+    return root, dict(sorted(directories.items()))
+
+# Function to project what describing every file again with create_metadata.py would cost
+# File tokens come from the cleaned chunks, so the estimate runs slightly low on whitespace
+def project_rebuild_cost(files, encoding):
+    file_list_prompt = create_metadata.build_file_list_prompt(files)
+    input_tokens = 0
+    for file in files:
+        overhead = create_metadata.build_description_prompt(file, "", create_metadata.FEW_SHOT_EXAMPLE, file_list_prompt)
+        input_tokens += len(encoding.encode(overhead)) + file['tokens']
+    output_tokens = len(files) * create_metadata.llm_client.MAX_TOKENS
+    return {
+        "files": len(files),
+        "input_tokens": input_tokens,
+        "max_output_tokens": output_tokens,
+        "max_cost_usd": tracing.token_cost(input_tokens, output_tokens),
+    }
+
+# Function to key per-file counts by file name, falling back to the path when a name repeats
+def token_counts_by_name(files, root):
+    names = defaultdict(int)
+    for file in files:
+        names[file['file_name']] += 1
+    return {
+        file['file_name'] if names[file['file_name']] == 1 else os.path.relpath(file['file_path'], root): file['tokens']
+        for file in files
+    }
+
+def count_tokens(path=chunks_json_path, model=MODEL, workers=8, cache_path=count_cache_path):
+    """Token report for a chunk JSON: per-file, per-directory, total and projected rebuild cost."""
+    encoding = context_packer.get_encoding(model)
+    counts = load_count_cache(cache_path, encoding.name) if cache_path else {}
+    files, stats = count_file_tokens(iter_json_array(path), encoding, counts, workers=workers)
+    if cache_path and stats["encoded"]:
+        save_count_cache(cache_path, encoding.name, counts)
+
+    root, directories = summarize_by_directory(files)
+    return {
+        "model": model,
+        "encoding": encoding.name,
+        "root": root,
+        "total_tokens": sum(file['tokens'] for file in files),
+        "files": token_counts_by_name(files, root),
+        "directories": directories,
+        "rebuild": project_rebuild_cost(files, encoding),
+        "stats": stats,
+    }
+
+# Function to tell whether a report was counted with the ~4 characters per token estimate instead of tiktoken
+def is_approximate(report):
+    return report["encoding"] == context_packer.ApproximateEncoding.name
+
+def main():
+    parser = argparse.ArgumentParser(description="Count tokens in the Verilog chunk JSON and project README rebuild cost.")
+    parser.add_argument("chunks", nargs="?", default=chunks_json_path)
+    parser.add_argument("-o", "--output", default=token_counts_path, help="Per-file token counts (token_counts.json).")
+    parser.add_argument("--report", help="Also write the full report (directories, totals, rebuild cost) as JSON.")
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("-w", "--workers", type=int, default=8)
+    parser.add_argument("--no-cache", action="store_true", help="Tokenize every chunk again.")
+    args = parser.parse_args()
+
+    report = count_tokens(args.chunks, model=args.model, workers=args.workers,
+                          cache_path=None if args.no_cache else count_cache_path)
+    stats = report["stats"]
+    print(f"Counted {stats['chunks']} chunks with {report['encoding']} "
+          f"({stats['encoded']} tokenized, {stats['reused']} reused from the cache or repeated).")
+
+    print("Token counts per file:")
+    for file_name, token_count in report["files"].items():
+        print(f"{file_name}: {token_count}")
+    print(f"\nToken counts per directory (under {report['root']}):")
+    for directory, token_count in report["directories"].items():
+        print(f"{directory}: {token_count}")
+    print(f"\nTotal tokens across all Verilog files: {report['total_tokens']}")
+
+    rebuild = report["rebuild"]
+    print(f"Projected full README rebuild: {rebuild['files']} calls, {rebuild['input_tokens']} input tokens, "
+          f"up to {rebuild['max_output_tokens']} output tokens, at most ${rebuild['max_cost_usd']:.4f} with {args.model}.")
+
+    if is_approximate(report) and os.path.abspath(args.output) == os.path.abspath(token_counts_path):
+        print(f"Counts are estimates ({report['encoding']}); {args.output} was left unchanged. Pass -o to save them elsewhere.")
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report["files"], f, indent=4)
+        print(f"Token counts saved to {args.output}.")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"Full report saved to {args.report}.")
+
+if __name__ == "__main__":
+    main()
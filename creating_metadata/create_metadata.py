@@ -1,40 +1,38 @@
+import argparse
+import hashlib
+import json
 import os
-import time
-import openai
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Initialize OpenAI client
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Shared helpers (API client, response cache, ...) live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import file_router
+import llm_client
+import response_cache
 
 # Paths for input and output files
-metadata_file_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata
-/verilog_files_metadata.txt"
-readme_output_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata
-/README.md"
+metadata_file_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/verilog_files_metadata.txt"
+readme_output_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/README.md"
+manifest_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/readme_manifest.json"
+directory_summary_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/DIRECTORY_SUMMARY.md"
+
+# Bump whenever the description prompt changes so every file is described again
+PROMPT_VERSION = 1
+
+# Number of files described concurrently; the request/token budget is enforced
+# process-wide by llm_client (VERILOG_QA_RPM / VERILOG_QA_TPM)
+max_workers = int(os.getenv("METADATA_WORKERS", "8"))
+
+# Progress callback for llm_client: the metadata builder reports with plain prints
+def print_report(level, message):
+    print(message)
 
 # Function to call the OpenAI API with retries and detailed prints
-def call_api_with_retries(content, max_retries=3):
-    attempts = 0
-    while attempts < max_retries:
-        try:
-            print(f"Calling API... Attempt {attempts + 1}/{max_retries}")
-            completion = openai.ChatCompletion.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant with a deep understanding of Verilog and hardware design."},
-                    {"role": "user", "content": content}
-                ],
-                max_tokens=1024
-            )
-            # Extract and return the message content from the API response
-            response = completion.choices[0].message.content.strip()
-            print("API call successful.")
-            return response
-        except Exception as e:
-            print(f"Error during API call: {e}. Retrying {attempts + 1}/{max_retries}...")
-            attempts += 1
-            time.sleep(2)  # Optional: sleep before retrying
-    print(f"Failed to process content after {max_retries} attempts.")
-    return None
+# Re-runs of the README rebuild reuse descriptions from the shared response cache
+def call_api_with_retries(content, max_retries=llm_client.MAX_RETRIES, use_cache=True):
+    return llm_client.complete(content, max_retries=max_retries, use_cache=use_cache, report=print_report)
 
 # Function to read the Verilog file metadata from a text file
 def read_verilog_files_metadata(file_path):
@@ -62,12 +60,8 @@ def read_verilog_file(file_path):
         print(f"Error reading file {file_path}: {e}")
         return None
 
-# Function to gather metadata for each Verilog file
-def gather_metadata_for_verilog_files(verilog_files):
-    metadata = []
-
-    # Few-shot example for prompting
-    few_shot_example = """
+# Few-shot example for prompting
+FEW_SHOT_EXAMPLE = """
     Example for Verilog file description:
 
     File Name: ffetch.v
@@ -78,23 +72,16 @@ def gather_metadata_for_verilog_files(verilog_files):
     Behavior: The module performs pipelined instruction fetching and maintains alignment with CPU control flow.
     """
 
-    # Create the prompt containing the list of Verilog files for better context
+# Function to create the prompt containing the list of Verilog files for better context
+def build_file_list_prompt(verilog_files):
     verilog_file_list_prompt = "Here is a list of Verilog files and their locations:\n"
     for vf in verilog_files:
         verilog_file_list_prompt += f"File Name: {vf['file_name']}, File Path: {vf['file_path']}\n"
+    return verilog_file_list_prompt
 
-    # For each Verilog file, gather metadata using the API
-    for idx, vf in enumerate(verilog_files):
-        print(f"\nProcessing file {idx + 1}/{len(verilog_files)}: {vf['file_name']}")
-
-        # Read the Verilog file contents
-        verilog_contents = read_verilog_file(vf['file_path'])
-        if not verilog_contents:
-            print(f"Skipping {vf['file_name']} due to file read error.")
-            continue
-
-        # Prompt construction with Verilog contents
-        prompt = f"""
+# Function to build the description prompt for one Verilog file
+def build_description_prompt(vf, verilog_contents, few_shot_example, verilog_file_list_prompt):
+    return f"""
         {few_shot_example}
         {verilog_file_list_prompt}
         
@@ -109,20 +96,57 @@ def gather_metadata_for_verilog_files(verilog_files):
         - The behavior of the module, including any control logic or state machines.
         """
 
-        # Call the API to get the metadata for the file
-        response = call_api_with_retries(prompt)
-        
-        if response:
-            print(f"Successfully gathered metadata for {vf['file_name']}.")
-            metadata.append({
-                "file_name": vf['file_name'],
-                "file_path": vf['file_path'],
-                "description": response
-            })
-        else:
-            print(f"Failed to gather metadata for {vf['file_name']}. Skipping...")
+# Function to describe a single Verilog file; returns None so one failure never stops the others
+def describe_verilog_file(vf, few_shot_example, verilog_file_list_prompt):
+    # Read the Verilog file contents
+    verilog_contents = read_verilog_file(vf['file_path'])
+    if not verilog_contents:
+        print(f"Skipping {vf['file_name']} due to file read error.")
+        return None
+
+    # Prompt construction with Verilog contents
+    prompt = build_description_prompt(vf, verilog_contents, few_shot_example, verilog_file_list_prompt)
+
+    # Call the API to get the metadata for the file
+    response = call_api_with_retries(prompt)
+    if not response:
+        print(f"Failed to gather metadata for {vf['file_name']}. Skipping...")
+        return None
+
+    print(f"Successfully gathered metadata for {vf['file_name']}.")
+    return {
+        "file_name": vf['file_name'],
+        "file_path": vf['file_path'],
+        "description": response,
+        "content_hash": hash_contents(verilog_contents),
+        "prompt_version": PROMPT_VERSION
+    }
 
-    return metadata
+# Function to gather metadata for each Verilog file with a bounded pool of workers
+# all_verilog_files is the full file list shown in each prompt; it defaults to verilog_files
+def gather_metadata_for_verilog_files(verilog_files, workers=None, all_verilog_files=None):
+    workers = workers or max_workers
+
+    few_shot_example = FEW_SHOT_EXAMPLE
+    verilog_file_list_prompt = build_file_list_prompt(all_verilog_files or verilog_files)
+
+    # Results are slotted by input index so the README order stays deterministic
+    results = [None] * len(verilog_files)
+    print(f"Describing {len(verilog_files)} files with {workers} workers...")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(describe_verilog_file, vf, few_shot_example, verilog_file_list_prompt): idx
+            for idx, vf in enumerate(verilog_files)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            idx = futures[future]
+            try:
+                results[idx] = future.result()
+            except Exception as e:
+                print(f"Error describing {verilog_files[idx]['file_name']}: {e}")
+            print(f"Finished {done}/{len(verilog_files)}: {verilog_files[idx]['file_name']}")
+
+    return [data for data in results if data]
 
 # Function to create a README file from scratch with the gathered metadata
 def create_readme_from_scratch(metadata, output_path):
@@ -150,26 +174,226 @@ def create_readme_from_scratch(metadata, output_path):
         # Add metadata for each Verilog file
         f.write("## Verilog File Descriptions\n\n")
         for data in metadata:
-            f.write(f"### File: {data['file_name']}\n")
-            f.write(f"- **Path**: {data['file_path']}\n")
-            f.write(f"{data['description']}\n\n")
+            f.write(format_readme_section(data))
 
     print(f"README file has been successfully created and saved to {output_path}.")
 
-# Main script to gather Verilog file metadata and create the README
+# Function to render the README section for one Verilog file
+def format_readme_section(data):
+    return f"### File: {data['file_name']}\n- **Path**: {data['file_path']}\n{data['description']}\n\n"
+
+# Function to split an existing README into its preamble and {file_path: section text}
+def split_readme_sections(readme_content):
+    headers = list(re.finditer(r"^### File: .+$", readme_content, re.MULTILINE))
+    if not headers:
+        return readme_content, {}
+    sections = {}
+    for idx, header in enumerate(headers):
+        end = headers[idx + 1].start() if idx + 1 < len(headers) else len(readme_content)
+        section = readme_content[header.start():end]
+        path_match = re.search(r"- \*\*Path\*\*: (\S+)", section)
+        if path_match:
+            sections[path_match.group(1)] = section
+    return readme_content[:headers[0].start()], sections
+
+# Function to rewrite only the changed sections of an existing README, keeping the rest verbatim
+def splice_readme(metadata, changed_paths, output_path):
+    with open(output_path, "r") as f:
+        preamble, sections = split_readme_sections(f.read())
+
+    print(f"\nSplicing {len(changed_paths)} updated sections into {output_path}...")
+    with open(output_path + ".tmp", "w") as f:
+        f.write(preamble)
+        for data in metadata:
+            if data['file_path'] in changed_paths or data['file_path'] not in sections:
+                f.write(format_readme_section(data))
+            else:
+                f.write(sections[data['file_path']])
+    os.replace(output_path + ".tmp", output_path)
+    print(f"README file has been successfully updated at {output_path}.")
+
+# Function to hash Verilog source so unchanged files can skip the API
+def hash_contents(contents):
+    return hashlib.sha256(contents.encode("utf-8")).hexdigest()
+
+# Function to load the per-file manifest of content hashes and descriptions
+def load_manifest(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"files": {}, "directories": {}}
+    except Exception as e:
+        print(f"Error reading manifest {path}: {e}. Starting from an empty manifest.")
+        return {"files": {}, "directories": {}}
+
+def save_manifest(manifest, path):
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+# Function to split the file list into files whose manifest entry is current and files that need the API
+def plan_incremental_rebuild(verilog_files, manifest, force=False):
+    up_to_date, stale = [], []
+    for vf in verilog_files:
+        entry = manifest["files"].get(vf['file_path'])
+        contents = read_verilog_file(vf['file_path'])
+        if (not force and entry and contents is not None
+                and entry.get("content_hash") == hash_contents(contents)
+                and entry.get("prompt_version") == PROMPT_VERSION):
+            up_to_date.append(vf)
+        else:
+            stale.append(vf)
+    return up_to_date, stale
+
+# Function to seed the manifest from an existing README, assuming it describes the current sources
+def adopt_readme_into_manifest(verilog_files, manifest, readme_path):
+    with open(readme_path, "r") as f:
+        _, sections = split_readme_sections(f.read())
+    adopted = 0
+    for vf in verilog_files:
+        section = sections.get(vf['file_path'])
+        contents = read_verilog_file(vf['file_path'])
+        if section is None or contents is None:
+            continue
+        description = section.split("\n", 2)[2].rstrip("\n") if section.count("\n") >= 2 else ""
+        manifest["files"][vf['file_path']] = {
+            "file_name": vf['file_name'],
+            "content_hash": hash_contents(contents),
+            "prompt_version": PROMPT_VERSION,
+            "description": description
+        }
+        adopted += 1
+    print(f"Adopted {adopted} existing README descriptions into the manifest.")
+
+# Function to group README metadata by source directory, relative to the root of the Verilog tree
+def group_by_directory(metadata):
+    paths = [data['file_path'] for data in metadata]
+    root = os.path.commonpath(paths) if len(paths) > 1 else os.path.dirname(paths[0]) if paths else ""
+    groups = {}
+    for data in metadata:
+        groups.setdefault(os.path.relpath(os.path.dirname(data['file_path']), root), []).append(data)
+    return root, dict(sorted(groups.items()))
+
+# Function to build the prompt for one directory summary from its files' (shortened) descriptions
+def build_directory_prompt(directory, files):
+    file_lines = "\n".join(
+        f"- {data['file_name']}: {file_router.summarize_description(data['description'], max_chars=400)}"
+        for data in files
+    )
+    return (
+        f"The directory {directory} of the Zip CPU source tree contains these Verilog files:\n\n"
+        f"{file_lines}\n\n"
+        f"In at most 80 words, summarize what this directory contains and which kinds of questions "
+        f"its files can answer. Mention the most important files by name. Respond with the summary only."
+    )
+
+# Function to hash what a directory summary depends on, so unchanged directories skip the API
+def hash_directory(files):
+    return hash_contents("\n".join(sorted(f"{data['file_path']}:{data['content_hash']}" for data in files)))
+
+# Function to summarize every new or changed directory with a bounded pool of workers
+def summarize_directories(metadata, manifest, force=False, workers=None):
+    root, groups = group_by_directory(metadata)
+    entries = manifest.setdefault("directories", {})
+    stale = [
+        directory for directory, files in groups.items()
+        if force or entries.get(directory, {}).get("files_hash") != hash_directory(files)
+    ]
+    print(f"{len(groups) - len(stale)} directory summaries unchanged, {len(stale)} new or changed.")
+
+    with ThreadPoolExecutor(max_workers=workers or max_workers) as executor:
+        futures = {executor.submit(call_api_with_retries, build_directory_prompt(d, groups[d])): d for d in stale}
+        for future in as_completed(futures):
+            directory = futures[future]
+            summary = future.result()
+            if summary:
+                entries[directory] = {"files_hash": hash_directory(groups[directory]), "summary": summary}
+            else:
+                print(f"Failed to summarize {directory}. Keeping the previous summary if there is one.")
+
+    for removed in [d for d in entries if d not in groups]:
+        del entries[removed]
+    return root, groups
+
+# Function to write the directory tier the LLM router reads before it sees any file descriptions
+def write_directory_summary(root, groups, manifest, output_path):
+    with open(output_path + ".tmp", "w") as f:
+        f.write("# Zip CPU Source Directories\n\n")
+        for directory, files in groups.items():
+            summary = manifest["directories"].get(directory, {}).get("summary", "")
+            f.write(f"### Directory: {directory}\n")
+            f.write(f"- **Path**: {os.path.join(root, directory)}\n")
+            f.write(f"- **Files**: {', '.join(data['file_name'] for data in files)}\n")
+            f.write(f"{summary}\n\n")
+    os.replace(output_path + ".tmp", output_path)
+    print(f"Directory summary written to {output_path}.")
+
+# Function to describe new or changed files and splice them into the README and the directory summary
+# candidates limits which files are checked against the manifest (default: all of them); full describes everything again
+def update_readme(verilog_files, candidates=None, full=False, adopt_readme=False):
+    manifest = load_manifest(manifest_path)
+    if adopt_readme and os.path.exists(readme_output_path):
+        adopt_readme_into_manifest(verilog_files, manifest, readme_output_path)
+    up_to_date, stale = plan_incremental_rebuild(verilog_files if candidates is None else candidates, manifest, force=full)
+    print(f"{len(up_to_date)} files unchanged, {len(stale)} new or changed.")
+
+    # Step 2: Gather metadata for new or changed Verilog files using the OpenAI API
+    print("\nStep 2: Gathering metadata for new or changed Verilog files using OpenAI API...")
+    fresh = gather_metadata_for_verilog_files(stale, all_verilog_files=verilog_files) if stale else []
+    for data in fresh:
+        manifest["files"][data['file_path']] = {
+            "file_name": data['file_name'],
+            "content_hash": data['content_hash'],
+            "prompt_version": data['prompt_version'],
+            "description": data['description']
+        }
+
+    # Files dropped from the metadata list also leave the manifest and the README
+    current_paths = {vf['file_path'] for vf in verilog_files}
+    removed = [path for path in manifest["files"] if path not in current_paths]
+    for path in removed:
+        print(f"Removing {path} from the manifest.")
+        del manifest["files"][path]
+    save_manifest(manifest, manifest_path)
+
+    metadata = [
+        dict(manifest["files"][vf['file_path']], file_path=vf['file_path'])
+        for vf in verilog_files if vf['file_path'] in manifest["files"]
+    ]
+
+    # Step 3: Splice the new descriptions into the README, or create it from scratch
+    if os.path.exists(readme_output_path) and not full:
+        if fresh or removed:
+            print("\nStep 3: Splicing the updated descriptions into the README...")
+            splice_readme(metadata, {data['file_path'] for data in fresh}, readme_output_path)
+    else:
+        print("\nStep 3: Creating the README from scratch with the gathered metadata...")
+        create_readme_from_scratch(metadata, readme_output_path)
+
+    # Step 4: Summarize each directory for the first level of LLM routing
+    print("\nStep 4: Summarizing directories for the routing tier...")
+    root, groups = summarize_directories(metadata, manifest, force=full)
+    save_manifest(manifest, manifest_path)
+    write_directory_summary(root, groups, manifest, directory_summary_path)
+    return fresh
+
+# Main script to gather Verilog file metadata and create or update the README
 def main():
+    parser = argparse.ArgumentParser(description="Generate README descriptions for the Verilog files.")
+    parser.add_argument("--full", action="store_true", help="Describe every file again, ignoring the manifest.")
+    parser.add_argument("--adopt-readme", action="store_true",
+                        help="Seed the manifest from the existing README instead of calling the API for every file.")
+    args = parser.parse_args()
+
     try:
         # Step 1: Read the Verilog files metadata from the provided text file
         print("Step 1: Reading Verilog files metadata...")
         verilog_files = read_verilog_files_metadata(metadata_file_path)
-        
-        # Step 2: Gather metadata for each Verilog file using the OpenAI API
-        print("\nStep 2: Gathering metadata for each Verilog file using OpenAI API...")
-        metadata = gather_metadata_for_verilog_files(verilog_files)
-        
-        # Step 3: Create the README from scratch with the gathered metadata
-        print("\nStep 3: Creating the README from scratch with the gathered metadata...")
-        create_readme_from_scratch(metadata, readme_output_path)
+        update_readme(verilog_files, full=args.full, adopt_readme=args.adopt_readme)
+
+        if not response_cache.cache_bypassed():
+            print(f"Response cache: {response_cache.get_shared_cache().stats()}")
     
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+# Builders shared with the Q&A app (chunker, indexes, ...) live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chunk_store
+import count_tokens
+import create_metadata
+import path_index
+import signal_index
+import verilog_chunker
+import verilog_index
+
+# Paths for input and output files
+source_root = path_index.SOURCE_ROOT
+metadata_file_path = create_metadata.metadata_file_path
+chunks_json_path = count_tokens.chunks_json_path
+token_counts_path = count_tokens.token_counts_path
+verilog_index_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/verilog_index.json"
+signal_index_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/signal_index.json"
+vector_index_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/chunk_vectors"
+
+# Seconds between scans of the source tree, and the quiet time a burst of changes must end with
+POLL_INTERVAL_SECONDS = float(os.getenv("VERILOG_QA_WATCH_INTERVAL", "1.0"))
+DEBOUNCE_SECONDS = float(os.getenv("VERILOG_QA_WATCH_DEBOUNCE", "2.0"))
+# A tree that never goes quiet (a long checkout) is still processed after this long
+MAX_DELAY_SECONDS = float(os.getenv("VERILOG_QA_WATCH_MAX_DELAY", "30.0"))
+
+# Function to snapshot {path: (mtime_ns, size)} of every Verilog source under root
+def scan_sources(root):
+    snapshot = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        for name in filenames:
+            if name.endswith(path_index.SOURCE_EXTENSIONS):
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+# Function to list the paths added, removed or modified between two snapshots
+def diff_snapshots(before, after):
+    return {path for path in before.keys() | after.keys() if before.get(path) != after.get(path)}
+
+# Function to write a file next to its final name and swap it in, so a running Q&A process never reads half of it
+def write_atomically(path, write):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        write(f)
+    os.replace(path + ".tmp", path)
+
+
+class MetadataUpdater:
+    """Brings the file list, chunks, token counts, indexes and README up to date with a set of changed sources.
+
+    Only the changed files are re-chunked and described again; token counts
+    reuse count_tokens' per-chunk cache. Every output is replaced atomically,
+    and the Q&A app's process cache reloads each one on the next query after
+    its mtime changes, so the running app picks the update up without a restart.
+    """
+
+    def __init__(self, root=None, describe=True):
+        self.root = root or source_root
+        self.describe = describe
+        self.lock = threading.Lock()
+
+    def read_file_list(self):
+        try:
+            return verilog_index.read_file_list(metadata_file_path)
+        except OSError:
+            return []
+
+    def pending_at_startup(self):
+        """Sources added, removed or modified since the file list and chunks were last written."""
+        listed = {vf['file_path'] for vf in self.read_file_list()}
+        on_disk = scan_sources(self.root)
+        try:
+            built = os.stat(chunks_json_path).st_mtime_ns
+        except OSError:
+            built = 0
+        return (listed ^ on_disk.keys()) | {path for path, (mtime, _) in on_disk.items() if mtime > built}
+
+    def update_file_list(self, changed):
+        """Drop deleted files from verilog_files_metadata.txt and append new ones; returns the new list."""
+        listed_files = self.read_file_list()
+        verilog_files = [vf for vf in listed_files if os.path.exists(vf['file_path'])]
+        listed = {vf['file_path'] for vf in listed_files}
+        added = sorted(path for path in changed if path not in listed and os.path.exists(path))
+        verilog_files += [{"file_name": os.path.basename(path), "file_path": path} for path in added]
+        if len(verilog_files) != len(listed_files) or added:
+            write_atomically(metadata_file_path, lambda f: f.writelines(
+                f"File Name: {vf['file_name']}, File Path: {vf['file_path']}\n" for vf in verilog_files))
+        print(f"File list: {len(verilog_files)} files ({len(added)} added, "
+              f"{len(listed_files) + len(added) - len(verilog_files)} removed).")
+        return verilog_files
+
+    def update_chunks(self, verilog_files, changed):
+        """Re-chunk the changed files and splice their records into the chunk JSON; returns all records.
+
+        The chunk JSON is written by verilog_chunker.py. A file still holding
+        chunks from an older chunker (no chunk_lines) is re-chunked whole
+        once, so it never mixes two chunkings.
+        """
+        try:
+            with open(chunks_json_path, "r") as f:
+                previous = {record['file_path']: record for record in json.load(f)}
+        except (OSError, ValueError):
+            previous = {}
+        rebuild = any('chunk_lines' not in record for record in previous.values())
+        if rebuild:
+            print("Chunk JSON was built by another chunker; re-chunking every file with verilog_chunker.")
+            previous = {}
+        stale = [vf for vf in verilog_files if vf['file_path'] in changed or vf['file_path'] not in previous]
+        fresh, headers = verilog_chunker.chunk_files(stale)
+        fresh = {record['file_path']: record for record in fresh}
+        records = [fresh.get(vf['file_path']) or previous[vf['file_path']]
+                   for vf in verilog_files if vf['file_path'] in fresh or vf['file_path'] in previous]
+        write_atomically(chunks_json_path, lambda f: json.dump(records, f, indent=2))
+
+        headers_path = verilog_chunker.headers_path_for(chunks_json_path)
+        if headers or rebuild:
+            if not rebuild:
+                try:
+                    with open(headers_path, "r") as f:
+                        headers = dict(json.load(f), **headers)
+                except (OSError, ValueError):
+                    pass
+            write_atomically(headers_path, lambda f: json.dump(headers, f, indent=2))
+        print(f"Chunks: re-chunked {len(fresh)} files, kept {len(records) - len(fresh)}.")
+        return records
+
+    def update_token_counts(self):
+        report = count_tokens.count_tokens(chunks_json_path)
+        if count_tokens.is_approximate(report):
+            print(f"Token counts are estimates ({report['encoding']}); {token_counts_path} was left unchanged.")
+            return
+        write_atomically(token_counts_path, lambda f: json.dump(report["files"], f, indent=4))
+        print(f"Token counts: {report['total_tokens']} tokens ({report['stats']['encoded']} chunks tokenized).")
+
+    def update_indexes(self, verilog_files, records):
+        """Rebuild the structural and signal indexes, and the chunk store and vector index where they exist."""
+        index = verilog_index.build_index(verilog_files)
+        index.save(verilog_index_path + ".tmp")
+        os.replace(verilog_index_path + ".tmp", verilog_index_path)
+        signals = signal_index.SignalIndex.build(verilog_files)
+        signals.save(signal_index_path + ".tmp")
+        os.replace(signal_index_path + ".tmp", signal_index_path)
+        print(f"Indexes: {len(index.modules)} modules, {len(signals.sites)} signal names.")
+
+        # Stale chunk stores are ignored (file_router falls back to the JSON); rebuild the ones in use
+        if os.path.exists(chunk_store.store_paths(chunk_store.default_store_path(chunks_json_path))[0]):
+            chunk_store.convert_json(chunks_json_path)
+            print("Chunk store rebuilt.")
+        # numpy is only needed when a vector index is in use
+        import vector_index
+        if all(os.path.exists(path) for path in vector_index.index_paths(vector_index_path)):
+            vectors = vector_index.VectorIndex.build(records)
+            vectors.save(vector_index_path + ".tmp")
+            # Matrices first and the row table last; the app reloads once all three have changed
+            for suffix in (".npy", ".idf.npy", ".json"):
+                os.replace(vector_index_path + ".tmp" + suffix, vector_index_path + suffix)
+            print(f"Vector index rebuilt ({len(vectors.rows)} chunks).")
+
+    def apply(self, changed):
+        """Bring every output up to date with the changed paths (added, modified or deleted sources)."""
+        with self.lock:
+            started = time.perf_counter()
+            print(f"\nUpdating metadata for {len(changed)} changed files...")
+            verilog_files = self.update_file_list(changed)
+            records = self.update_chunks(verilog_files, changed)
+            self.update_token_counts()
+            self.update_indexes(verilog_files, records)
+            # Descriptions need the API, so they come last; everything above is already live
+            if self.describe:
+                existing = [vf for vf in verilog_files if vf['file_path'] in changed]
+                create_metadata.update_readme(verilog_files, candidates=existing)
+            print(f"Metadata updated in {time.perf_counter() - started:.1f}s.")
+
+
+class SourceWatcher:
+    """Polls the source tree and hands debounced batches of changed paths to a background worker.
+
+    Changes are collected until the tree has been quiet for debounce seconds
+    (or max_delay has passed), so saving ten files or switching branches
+    triggers one update. Batches that arrive while an update runs are merged
+    into the next one.
+    """
+
+    def __init__(self, root, on_change, interval=POLL_INTERVAL_SECONDS, debounce=DEBOUNCE_SECONDS,
+                 max_delay=MAX_DELAY_SECONDS):
+        self.root = root
+        self.on_change = on_change
+        self.interval = interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.batches = queue.Queue()
+        self.stopped = threading.Event()
+        self.snapshot = scan_sources(root)
+        self.pending = set()
+        self.first_change = self.last_change = None
+        self.stats = {"scans": 0, "batches": 0, "updates": 0, "errors": 0}
+
+    def poll(self, now=None):
+        """Scan once; queue the pending changes when the debounce window has closed."""
+        now = time.monotonic() if now is None else now
+        current = scan_sources(self.root)
+        changed = diff_snapshots(self.snapshot, current)
+        self.snapshot = current
+        self.stats["scans"] += 1
+        if changed:
+            self.pending |= changed
+            self.first_change = self.first_change or now
+            self.last_change = now
+        if self.pending and (now - self.last_change >= self.debounce or now - self.first_change >= self.max_delay):
+            self.submit(self.pending)
+            self.pending = set()
+            self.first_change = self.last_change = None
+
+    def submit(self, paths):
+        self.batches.put(set(paths))
+        self.stats["batches"] += 1
+
+    def work(self):
+        while not self.stopped.is_set():
+            try:
+                changed = self.batches.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            while not self.batches.empty():
+                changed |= self.batches.get_nowait()
+            try:
+                self.on_change(changed)
+                self.stats["updates"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Error updating metadata for {len(changed)} files: {e}")
+
+    def watch(self):
+        while not self.stopped.wait(self.interval):
+            self.poll()
+
+    def start(self):
+        """Run the poller and the worker on daemon threads; returns self."""
+        threading.Thread(target=self.work, daemon=True, name="metadata-worker").start()
+        threading.Thread(target=self.watch, daemon=True, name="source-watcher").start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the file list, chunks, token counts, indexes and README "
+                                                 "current while the Verilog sources change.")
+    parser.add_argument("--root", default=source_root, help="Source tree to watch.")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL_SECONDS)
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE_SECONDS)
+    parser.add_argument("--no-describe", action="store_true",
+                        help="Skip README descriptions (no API calls); everything else is still updated.")
+    parser.add_argument("--once", action="store_true", help="Catch up with changes made since the last build and exit.")
+    args = parser.parse_args()
+
+    updater = MetadataUpdater(args.root, describe=not args.no_describe)
+    watcher = SourceWatcher(args.root, updater.apply, args.interval, args.debounce)
+    pending = updater.pending_at_startup()
+    if args.once:
+        if pending:
+            updater.apply(pending)
+        else:
+            print("Metadata is up to date.")
+        return
+
+    if pending:
+        print(f"{len(pending)} files changed since the last build.")
+        watcher.submit(pending)
+    watcher.start()
+    print(f"Watching {len(watcher.snapshot)} Verilog files under {args.root} "
+          f"(every {args.interval}s, {args.debounce}s debounce). Ctrl-C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    main()
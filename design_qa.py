@@ -1,19 +1,179 @@
+import logging
 import os
+import threading
 import time
-import openai
+from contextlib import contextmanager
 import re
+import requests
 import streamlit as st
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
+import context_packer
+import file_router
+import llm_client
+import path_index
+import prefetch
+import process_cache
+import qa_session
+import response_cache
+import signal_index
+import tracing
+import vector_index
+import verilog_index
 
 readme_output_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/README.md"
+directory_summary_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/DIRECTORY_SUMMARY.md"
 verilog_files_dir = "/Users/frankliu/Desktop/fa24/Takehome/bronco-zipcpu/"
+chunks_json_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/cleaned/cleaned_verilog_chunks.json"
+verilog_index_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/verilog_index.json"
+vector_index_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/chunk_vectors"
+signal_index_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/signal_index.json"
 
-def get_relevant_files_from_readme(query):
-    """Prepend README to the query and ask OpenAI which Verilog files are relevant."""
-    readme_content = read_file(readme_output_path)
+# Set VERILOG_QA_STREAMING=0 to always use the blocking API path
+STREAMING_ENABLED = os.getenv("VERILOG_QA_STREAMING", "1").lower() not in ("0", "false", "no")
+# Local file ranking: "bm25", "vector" (vector_index.py) or "hybrid" (both, rank-fused); "llm" always asks the LLM router
+RETRIEVAL_BACKEND = os.getenv("VERILOG_QA_RETRIEVAL", "bm25").lower()
+# When set (e.g. http://127.0.0.1:8502), the app sends queries to qa_service.py instead of running them itself
+SERVICE_URL = os.getenv("VERILOG_QA_SERVICE_URL")
+SERVICE_TIMEOUT_SECONDS = float(os.getenv("VERILOG_QA_SERVICE_TIMEOUT", "300"))
+# The LLM router picks at most this many directories before it sees file descriptions
+MAX_ROUTED_DIRECTORIES = 3
+
+logger = logging.getLogger("design_qa")
+_output = threading.local()
+
+
+class HeadlessUI:
+    """Stand-in for the Streamlit calls the pipeline makes, logging instead of rendering."""
+
+    def _log(self, level, *args):
+        logger.log(level, " ".join(str(arg) for arg in args))
+
+    def write(self, *args, **kwargs):
+        self._log(logging.DEBUG, *args)
+
+    markdown = text = caption = subheader = write
+
+    def warning(self, *args, **kwargs):
+        self._log(logging.WARNING, *args)
+
+    error = warning
+
+    def empty(self):
+        return _HeadlessSlot()
+
+
+class _HeadlessSlot:
+    """Placeholder whose streamed partial renders are dropped."""
+
+    def markdown(self, *args, **kwargs):
+        pass
+
+    def empty(self):
+        pass
+
+
+def ui():
+    """Where pipeline progress goes: Streamlit, or this thread's headless override."""
+    return getattr(_output, "ui", None) or st
+
+
+@contextmanager
+def headless():
+    """Report pipeline progress on this thread through logging instead of Streamlit."""
+    previous = getattr(_output, "ui", None)
+    _output.ui = HeadlessUI()
+    try:
+        yield
+    finally:
+        _output.ui = previous
+
+def get_relevant_files_from_readme(query, on_text=None):
+    """Rank files with the local BM25 index, falling back to the LLM router when it is not confident.
+
+    on_text, when given, is called with the LLM router's response so far as it streams.
+    """
+    ui().subheader("Relevant File Response")
+    response_slot = ui().empty()
+    router = file_router.load_router(readme_output_path, chunks_json_path) if RETRIEVAL_BACKEND != "llm" else None
+    if router:
+        ranked, confident, label = route_locally(query, router)
+        if confident:
+            ui().write(f"Relevant files selected by the local {label} index.")
+            tracing.record_router(label)
+            response = router.format_response(query, ranked, label=label)
+            response_slot.markdown(response)
+            return response
+        ui().write("Local index is not confident, falling back to the LLM router...")
+    tracing.record_router("llm")
+    return get_relevant_files_from_llm(query, response_slot, on_text)
+
+
+def route_locally(query, router):
+    """Rank files with the configured local backend; returns (ranked, confident, label)."""
+    ranked, confident = router.route(query)
+    if RETRIEVAL_BACKEND not in ("vector", "hybrid"):
+        return ranked, confident, "BM25"
+    index = vector_index.load_vector_index(vector_index_path)
+    if index is None:
+        return ranked, confident, "BM25"
+    vector_ranked, vector_confident = index.route(query)
+    if RETRIEVAL_BACKEND == "vector":
+        return vector_ranked, vector_confident, "vector"
+    fused = vector_index.reciprocal_rank_fusion([ranked, vector_ranked])
+    return fused, confident or vector_confident, "hybrid"
+
+
+def select_directory_context(query, readme_content):
+    """First routing level: let the LLM pick directories from the summary tier.
+
+    Returns the shortened README sections of the files in the chosen
+    directories, or None when there is no summary tier or no usable answer
+    (the caller then sends the full README).
+    """
+    try:
+        summary_content = process_cache.shared.read_text(directory_summary_path)
+    except OSError:
+        return None
+    directories = file_router.parse_directory_summary(summary_content)
+    if not directories:
+        return None
+
+    prompt = (
+        f"{summary_content}\n\n"
+        f"Given the directory summaries above, which directories most likely contain the Verilog files "
+        f"needed to answer the following query? Pick at most {MAX_ROUTED_DIRECTORIES}.\n\n"
+        f"Query: {query}\n\n"
+        f"Respond with one line per directory in the form:\nDirectory: <directory>"
+    )
+    with tracing.stage("routing_directories"):
+        response = call_api_with_retries(prompt)
+    chosen = []
+    for directory in re.findall(r"Directory:\s*`?([^\s`*]+)", response or ""):
+        directory = directory.strip("/")
+        if directory in directories and directory not in chosen:
+            chosen.append(directory)
+    chosen = chosen[:MAX_ROUTED_DIRECTORIES]
+    if not chosen:
+        ui().write("No directories selected, sending the full README instead.")
+        return None
+
+    ui().write(f"Routing within {', '.join(chosen)}.")
+    chosen_paths = {(directories[directory]["path"] or "").rstrip("/") for directory in chosen}
+    sections = process_cache.shared.get(("readme_sections", readme_output_path), [readme_output_path],
+                                        lambda: file_router.parse_readme_sections(readme_content))
+    return "\n".join(
+        f"### File: {section['file_name']}\n- **Path**: {path}\n{file_router.summarize_description(section['description'])}\n"
+        for path, section in sections.items() if os.path.dirname(path) in chosen_paths
+    )
+
+
+def get_relevant_files_from_llm(query, placeholder=None, on_text=None):
+    """Ask OpenAI which Verilog files are relevant, narrowing to a few directories first when possible."""
+    with tracing.stage("readme_read"):
+        readme_content = read_file(readme_output_path)
     if not readme_content:
         return []
+    readme_content = select_directory_context(query, readme_content) or readme_content
 
     example_response = """
 To answer the query regarding [query] the relevant Verilog files along with their paths are:
@@ -37,125 +197,286 @@ To answer the query regarding [query] the relevant Verilog files along with thei
     )
 
 
+    if placeholder is not None:
+        return call_api_streaming(prompt, placeholder, on_text=on_text)
     response = call_api_with_retries(prompt)
     return response
 
 
-def call_api_with_retries(content, max_retries=3):
-    attempts = 0
-    while attempts < max_retries:
-        try:
-            st.write(f"Calling API... Attempt {attempts + 1}/{max_retries}")
-            completion = openai.ChatCompletion.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant with a deep understanding of Verilog and hardware design."},
-                    {"role": "user", "content": content}
-                ],
-                max_tokens=1024
-            )
-
-            response = completion.choices[0]['message']['content'].strip()
-            st.write("API call successful.")
-            return response
-        except Exception as e:
-            st.error(f"Error during API call: {e}. Retrying {attempts + 1}/{max_retries}...")
-            attempts += 1
-            time.sleep(2)
-    st.error(f"Failed to process content after {max_retries} attempts.")
-    return None
+def report_to_ui(level, message):
+    """llm_client progress callback that writes to the current UI."""
+    {"info": ui().write, "warning": ui().warning}.get(level, ui().error)(message)
+
+
+def call_api_streaming(content, placeholder, use_cache=True, on_text=None):
+    """Stream the completion into a Streamlit placeholder, falling back to the blocking call.
+
+    on_text, when given, also receives the response text so far on every delta.
+    """
+    def on_delta(text):
+        placeholder.markdown(text + "▌")
+        if on_text:
+            on_text(text)
+
+    response = None
+    if STREAMING_ENABLED:
+        ui().write("Streaming API response...")
+        start = time.perf_counter()
+        response, first_token_at = llm_client.stream(
+            content, on_delta, use_cache=use_cache,
+            report=report_to_ui, count_tokens=context_packer.count_tokens)
+        if response and first_token_at is not None:
+            ui().caption(f"Time to first token: {first_token_at:.2f}s, full response: {time.perf_counter() - start:.2f}s")
+
+    if not response:
+        response = call_api_with_retries(content, use_cache=use_cache)
+        if not response:
+            placeholder.empty()
+            return None
+
+    placeholder.markdown(response)
+    return response
+
+
+def call_api_with_retries(content, max_retries=llm_client.MAX_RETRIES, use_cache=True):
+    return llm_client.complete(content, max_retries=max_retries, use_cache=use_cache, report=report_to_ui)
 
 
 def read_file(file_path):
-    """Read the contents of a file."""
+    """Read the contents of a file, served from the process cache until it changes on disk."""
     try:
-        with open(file_path, 'r') as file:
-            return file.read()
+        return process_cache.shared.read_text(file_path)
     except Exception as e:
-        st.error(f"Error reading {file_path}: {e}")
+        ui().error(f"Error reading {file_path}: {e}")
         return None
 
 
 def extract_file_info(response):
-    """Extract file name, path, and purpose from the LLM response."""
+    """Resolve the files mentioned in the LLM response (paths or bare names) against the source tree."""
     file_info = []
-    pattern = re.compile(r"(\/Users\/frankliu\/Desktop\/fa24\/Takehome\/bronco-zipcpu\/(bench|rtl|sim)\/(formal|mcy|zipcpu|zipdma|core|ex|peripherals|rtl)\/[a-zA-Z0-9_\-]+\.v)", re.DOTALL)
-    matches = pattern.findall(response)
-    for match in matches:
+    for file_path in path_index.load_path_index().extract(response):
         file_info.append({
-            "file_path": match[0]
+            "file_path": file_path
         })
     return file_info
 
-def gather_file_contents(file_paths):
-    """Gather the contents of the provided Verilog file paths."""
-    file_contents = []
-    for file_path in file_paths:
-        full_path = file_path.strip()
-        content = read_file(full_path)
-        if content:
-            file_contents.append((file_path, content))
-        else:
-            st.warning(f"Skipping {file_path} due to read error.")
-    return file_contents
-
-def design_qa(query):
-    st.write(f"Received query: {query}")
-
-
-    st.write("Identifying relevant files based on the README...")
-    relevant_files_response = get_relevant_files_from_readme(query)
+def gather_file_contents(file_paths, prefetcher=None):
+    """Gather the contents and chunks of the provided Verilog file paths, reading them in parallel.
+
+    Files the prefetcher already started while routing streamed are just
+    waited for. Returns (file_contents, prepared) for context_packer.pack_context.
+    """
+    prefetcher = prefetcher or prefetch.FilePrefetcher()
+    file_contents, prepared, errors = prefetcher.collect(file_paths)
+    for file_path, error in errors:
+        ui().warning(f"Skipping {file_path} due to read error: {error}")
+    return file_contents, prepared
+
+def failed(message):
+    """Record message as the query's error on the active trace; returns it as the answer text."""
+    tracing.record_error(message)
+    return message
+
+def design_qa(query, answer_slot=None, session=None):
+    """Answer a query; when answer_slot is a Streamlit placeholder the answer streams into it.
+
+    With a qa_session.QASession, earlier turns go into the answer prompt and a
+    follow-up the session's files still cover skips routing and file reads.
+    """
+    ui().write(f"Received query: {query}")
+
+    if session is not None:
+        with tracing.stage("session_check"):
+            covered = session.covers(query)
+        if covered:
+            ui().write(f"Answering the follow-up from the {len(session.file_paths)} files already in this conversation.")
+            session.reused += 1
+            tracing.record_files(session.file_paths)
+            final_response, packed_chunks = answer_from_files(query, session.file_contents, session.prepared,
+                                                              answer_slot, session)
+            session.add_turn(query, final_response, packed_chunks)
+            return final_response or failed("Unable to generate an answer based on the Verilog files.")
+
+    # Interface and hierarchy questions can be answered from the parsed RTL alone
+    with tracing.stage("structural_index"):
+        index = verilog_index.load_index(verilog_index_path)
+        structural_answer = index.answer(query) if index else None
+    if structural_answer:
+        ui().write("Answered from the structural Verilog index.")
+        if session is not None:
+            session.add_turn(query, structural_answer)
+        return structural_answer
+
+    ui().write("Identifying relevant files based on the README...")
+    # Files are read and chunked while the routing response is still streaming
+    prefetcher = prefetch.FilePrefetcher(path_index.load_path_index().resolve, index.related_files if index else None)
+    with tracing.stage("routing"):
+        relevant_files_response = get_relevant_files_from_readme(query, on_text=prefetcher.feed)
     if not relevant_files_response:
-        return "Unable to identify relevant files."
-    
-    
-    st.subheader(f"Relevant File Response")
-    st.markdown(relevant_files_response) 
+        return failed("Unable to identify relevant files.")
 
 
-    file_info = extract_file_info(relevant_files_response)
+    with tracing.stage("extract_file_info"):
+        file_info = extract_file_info(relevant_files_response)
+    tracing.record_routed_files([info['file_path'] for info in file_info])
     if not file_info:
         return "No relevant files found based on the query."
 
-    st.write(f"Identified relevant files: {file_info}")
+    ui().write(f"Identified relevant files: {file_info}")
 
     
     file_paths = [info['file_path'] for info in file_info]
-    file_contents = gather_file_contents(file_paths)
+    if index:
+        related_paths = index.related_files(file_paths)
+        if related_paths:
+            ui().write(f"Adding parent and child modules for context: {related_paths}")
+            file_paths += related_paths
+    tracing.record_files(file_paths)
+    with tracing.stage("gather_file_contents"):
+        file_contents, prepared = gather_file_contents(file_paths, prefetcher)
     if not file_contents:
-        return "Unable to gather file contents."
-
-
-    for file_path, content in file_contents:
-        st.subheader(f"File: {file_path}")
-        st.text(content[:3000])
-
-
-    st.write("Preparing final answer based on file contents...")
-    verilog_files_content = "\n".join([f"File: {fc[0]}\n{fc[1][:3000]}" for fc in file_contents])
-
+        return failed("Unable to gather file contents.")
+    prefetched = prefetcher.prefetched(file_paths)
+    if prefetched:
+        ui().write(f"{prefetched} of {len(file_paths)} files were read while the routing response streamed.")
+    if session is not None:
+        session.set_files([path for path, _ in file_contents], file_contents, prepared)
+
+    final_response, packed_chunks = answer_from_files(query, file_contents, prepared, answer_slot, session)
+    if session is not None:
+        session.add_turn(query, final_response, packed_chunks)
+    return final_response or failed("Unable to generate an answer based on the Verilog files.")
+
+def answer_from_files(query, file_contents, prepared, answer_slot=None, session=None):
+    """Pack the files' best chunks for the query and ask for the answer; returns (answer or None, packed chunks).
+
+    When the query names signals (i_clk, cpu_new_pc, ...), only line-numbered
+    windows around their declarations, drivers and uses are sent.
+    """
+    ui().write("Preparing final answer based on file contents...")
+    with tracing.stage("context_packing"):
+        signals = signal_index.load_signal_index(signal_index_path)
+        names = signals.signals_in(query) if signals else []
+        windows = signals.windows(names, file_contents) if names else []
+        if windows:
+            verilog_files_content, packed_chunks = signal_index.pack_windows(
+                windows, context_packer.DEFAULT_TOKEN_BUDGET, context_packer.count_tokens)
+        else:
+            verilog_files_content, packed_chunks = context_packer.pack_context(query, file_contents, prepared=prepared)
+    packed_tokens = sum(chunk['tokens'] for chunk in packed_chunks)
+    if windows:
+        ui().write(f"Packed {len(packed_chunks)} numbered windows around {', '.join(names)} ({packed_tokens} tokens).")
+    else:
+        ui().write(f"Packed {len(packed_chunks)} chunks ({packed_tokens} tokens of a "
+                   f"{context_packer.DEFAULT_TOKEN_BUDGET} token budget) from {len(file_contents)} files.")
+
+    for chunk in packed_chunks:
+        ui().subheader(f"File: {chunk['file_path']} (lines {chunk['start_line']}-{chunk['end_line']})")
+        ui().text(chunk['text'])
+
+    history = session.history_prompt(context_packer.count_tokens) if session is not None else ""
     answer_prompt = (
+        f"{history}"
         f"Based on the contents of the Verilog files below, please answer the following query:\n\n"
         f"{verilog_files_content}\n\n"
         f"Query: {query}"
+        f"{' Each source line above starts with its line number; cite lines as file:line.' if windows else ''}"
         f"When possible, reference specific lines of verilog to make the response more robust."
         f"Think step-by-step."
     )
 
-    final_response = call_api_with_retries(answer_prompt)
+    with tracing.stage("answer"):
+        if answer_slot is not None:
+            final_response = call_api_streaming(answer_prompt, answer_slot)
+        else:
+            final_response = call_api_with_retries(answer_prompt)
+    return final_response, packed_chunks
 
-    return final_response or "Unable to generate an answer based on the Verilog files."
+def run_query(query, session=None):
+    """Run the pipeline without Streamlit; returns the answer with files, per-stage latency and tokens.
+
+    error is set (and answer is the failure message) when an API call or the file reads came back empty.
+    """
+    trace = tracing.QueryTrace(query)
+    with headless(), tracing.activate(trace):
+        answer = design_qa(query, session=session)
+    return {"query": query, "answer": answer, **trace.to_dict()}
+
+def ask_service(query):
+    """Run the query on the qa_service.py backend; returns its run_query result, or None with a warning."""
+    try:
+        response = requests.post(f"{SERVICE_URL.rstrip('/')}/query", json={"query": query},
+                                 timeout=SERVICE_TIMEOUT_SECONDS)
+    except requests.RequestException as e:
+        st.error(f"Q&A service unavailable: {e}")
+        return None
+    if response.status_code == 503:
+        st.warning("The Q&A service is busy, please try again in a moment.")
+        return None
+    if response.status_code != 200:
+        st.error(f"Q&A service error {response.status_code}: {response.text}")
+        return None
+    return response.json()
+
+def render_trace_summary(summary):
+    """Per-query panel with wall time, tokens and cost for each pipeline stage (summary is QueryTrace.to_dict())."""
+    with st.expander(f"Query summary: {summary['total_seconds']:.2f}s ({'cold' if summary['cold'] else 'warm'}), "
+                     f"{summary['prompt_tokens'] + summary['completion_tokens']} tokens, ${summary['cost_usd']:.5f}"):
+        st.table([
+            {
+                "Stage": stage["stage"],
+                "Seconds": round(stage["seconds"], 3),
+                "First token (s)": round(stage["first_token_seconds"], 3) if stage["first_token_seconds"] else None,
+                "Prompt tokens": stage["prompt_tokens"],
+                "Completion tokens": stage["completion_tokens"],
+                "Cost ($)": round(stage["cost_usd"], 6),
+                "Cached": stage["cached"],
+            }
+            for stage in summary["stages"]
+        ])
 
 def main():
     st.title("Verilog Q&A Assistant")
+    tracing.start_metrics_server()
+
+    # One conversation per browser session; st.session_state survives reruns of this script
+    if "qa_session" not in st.session_state:
+        st.session_state.qa_session = qa_session.QASession()
+    session = st.session_state.qa_session
+    follow_ups = st.checkbox("Keep context for follow-up questions", value=True)
+    if session.turns and st.button("New conversation"):
+        session.clear()
+    if session.turns:
+        with st.expander(f"Conversation so far ({len(session.turns)} turns, {len(session.file_paths)} files)"):
+            for turn in session.turns:
+                st.markdown(f"**Q:** {turn['query']}")
+                st.markdown(turn["answer"])
 
     user_query = st.text_input("Ask a question about the Verilog codebase")
 
     if st.button("Submit"):
-        if user_query:
-            response = design_qa(user_query)
+        if user_query and SERVICE_URL:
+            st.subheader("Response")
+            with st.spinner("Waiting for the Q&A service..."):
+                result = ask_service(user_query)
+            if result:
+                st.markdown(result["answer"])
+                render_trace_summary(result)
+                if result.get("coalesced"):
+                    st.caption("Answered together with an identical query that was already running.")
+        elif user_query:
+            # Pipeline progress renders above the answer, which streams into its own slot
+            progress = st.container()
             st.subheader("Response")
-            st.write(response)
+            answer_slot = st.empty()
+            trace = tracing.QueryTrace(user_query)
+            with progress, tracing.activate(trace):
+                response = design_qa(user_query, answer_slot=answer_slot, session=session if follow_ups else None)
+            answer_slot.markdown(response)
+            render_trace_summary(trace.to_dict())
+            st.caption(f"Process cache: {process_cache.shared.stats()}")
+            if not response_cache.cache_bypassed():
+                st.caption(f"Response cache: {response_cache.get_shared_cache().stats()}")
         else:
             st.warning("Please enter a query.")
 
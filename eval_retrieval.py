@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+import context_packer
+import design_qa
+import llm_client
+import path_index
+from load_test import percentile
+
+golden_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_questions.json")
+# The README, chunk JSON and file list committed with the repository
+default_metadata_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "creating_metadata")
+
+# Routing strategies to compare: the local backend, which README the LLM router reads, and whether it
+# narrows to directories first. bm25/vector/hybrid fall back to the LLM router as they do in the app.
+STRATEGIES = {
+    "bm25": {"backend": "bm25", "readme": "README.md", "directories": True},
+    "vector": {"backend": "vector", "readme": "README.md", "directories": True},
+    "hybrid": {"backend": "hybrid", "readme": "README.md", "directories": True},
+    "llm": {"backend": "llm", "readme": "README.md", "directories": False},
+    "llm-3000": {"backend": "llm", "readme": "3000_README.md", "directories": False},
+    "llm-directories": {"backend": "llm", "readme": "README.md", "directories": True},
+}
+RECALL_AT = (1, 3, 5)
+# design_qa settings a strategy or --metadata-dir may change, restored after each run
+SETTINGS = ["RETRIEVAL_BACKEND", "readme_output_path", "directory_summary_path", "chunks_json_path",
+            "verilog_index_path", "vector_index_path", "signal_index_path"]
+
+
+def load_golden(path):
+    """[{"question", "level", "expected_files"}] where expected files are paths relative to the source root."""
+    with open(path, "r") as f:
+        rows = json.load(f)
+    return [{"question": row["question"], "level": row.get("level"), "expected_files": row["expected_files"]}
+            for row in rows]
+
+
+def matches(file_path, expected):
+    """True when file_path is the expected file (relative path, compared as a suffix, ignoring case and slashes)."""
+    file_path = file_path.replace("\\", "/").lower()
+    expected = expected.replace("\\", "/").lower().strip("/")
+    return file_path == expected or file_path.endswith("/" + expected)
+
+
+def score(routed, expected):
+    """recall@k for RECALL_AT and precision of one query's ranked picks against its expected files."""
+    hits = [any(matches(path, want) for want in expected) for path in routed]
+    scores = {f"recall@{k}": sum(any(matches(path, want) for path in routed[:k]) for want in expected) / len(expected)
+              for k in RECALL_AT}
+    scores["precision"] = sum(hits) / len(routed) if routed else 0.0
+    return scores
+
+
+@contextmanager
+def strategy_settings(name, metadata_dir=None, source_root=None):
+    """Point design_qa at a strategy's backend and README.
+
+    metadata_dir re-roots every metadata path, including the file list the
+    path index resolves routed files against; source_root moves the source tree.
+    """
+    config = STRATEGIES[name]
+    saved = {setting: getattr(design_qa, setting) for setting in SETTINGS}
+    saved_paths = (path_index.SOURCE_ROOT, path_index.metadata_file_path)
+    base = os.path.dirname(design_qa.readme_output_path)
+    try:
+        if metadata_dir:
+            for setting in SETTINGS[1:]:
+                setattr(design_qa, setting, os.path.join(metadata_dir, os.path.relpath(saved[setting], base)))
+            path_index.metadata_file_path = os.path.join(metadata_dir, os.path.relpath(saved_paths[1], base))
+            base = metadata_dir
+        if source_root:
+            path_index.SOURCE_ROOT = source_root
+        design_qa.RETRIEVAL_BACKEND = config["backend"]
+        design_qa.readme_output_path = os.path.join(base, config["readme"])
+        if not config["directories"]:
+            design_qa.directory_summary_path = os.path.join(base, "DIRECTORY_SUMMARY.disabled")
+        yield config
+    finally:
+        for setting, value in saved.items():
+            setattr(design_qa, setting, value)
+        path_index.SOURCE_ROOT, path_index.metadata_file_path = saved_paths
+
+
+def unreadable_inputs(name, metadata_dir=None, source_root=None):
+    """README, chunk JSON and (without source_root) file list a strategy reads that cannot be opened.
+
+    Without them every query fails to route and scores 0, which says nothing about the strategy.
+    """
+    with strategy_settings(name, metadata_dir, source_root):
+        paths = [design_qa.readme_output_path, design_qa.chunks_json_path]
+        if not source_root:
+            paths.append(path_index.metadata_file_path)
+    return [path for path in paths if not os.access(path, os.R_OK)]
+
+
+def evaluate(name, golden, repeats=1, metadata_dir=None, source_root=None):
+    """Run every golden question through the full pipeline under one strategy; returns per-query samples.
+
+    Questions answered without routing (the structural index) carry no
+    routed files and are left out of the retrieval scores.
+    """
+    samples = []
+    with strategy_settings(name, metadata_dir, source_root):
+        for run in range(repeats):
+            for item in golden:
+                result = design_qa.run_query(item["question"])
+                stages = result["stages"]
+                routing = [stage for stage in stages if stage["stage"].startswith("routing")]
+                sample = {
+                    "strategy": name,
+                    "question": item["question"],
+                    "level": item["level"],
+                    "run": run,
+                    "router": result["router"],
+                    "directory_tier": any(stage["stage"] == "routing_directories" for stage in stages),
+                    "routed_files": result["routed_files"],
+                    "expected_files": item["expected_files"],
+                    "total_seconds": result["total_seconds"],
+                    "routing_seconds": sum(stage["seconds"] for stage in stages if stage["stage"] == "routing"),
+                    "tokens": result["prompt_tokens"] + result["completion_tokens"],
+                    "routing_tokens": sum(stage["prompt_tokens"] + stage["completion_tokens"] for stage in routing),
+                    "cost_usd": result["cost_usd"],
+                    "answer": result["answer"],
+                }
+                if result["router"] is not None:
+                    sample.update(score(result["routed_files"], item["expected_files"]))
+                samples.append(sample)
+    return samples
+
+
+def summarize(samples, config=None):
+    """Mean retrieval scores, latency percentiles and mean token cost of one strategy's samples.
+
+    A strategy whose own router never ran gets a "not_measured" reason instead
+    of passing for a separate result: vector or hybrid answered by BM25 (no
+    chunk_vectors index), or the directory tier never reached (no DIRECTORY_SUMMARY.md).
+    """
+    routed = [sample for sample in samples if sample["router"] is not None]
+    summary = {
+        "queries": len(samples),
+        "routed": len(routed),
+        "routers": sorted({sample["router"] for sample in routed}),
+        "directory_tier": sum(1 for sample in samples if sample["directory_tier"]),
+        "not_measured": None,
+    }
+    # The LLM router is the app's fallback for every backend; any other router means the backend's index was missing
+    fallbacks = sorted(router for router in summary["routers"] if router != "llm" and router.lower() != (config or {}).get("backend"))
+    if config and fallbacks:
+        summary["not_measured"] = f"{config['backend']} routing never ran (no chunk_vectors index?); routed by {', '.join(fallbacks)}"
+    elif config and config["backend"] == "llm" and config["directories"] and routed and not summary["directory_tier"]:
+        summary["not_measured"] = "directory tier never ran (no DIRECTORY_SUMMARY.md); same as llm"
+    for metric in [f"recall@{k}" for k in RECALL_AT] + ["precision"]:
+        summary[metric] = sum(sample[metric] for sample in routed) / len(routed) if routed else None
+    for metric in ("total_seconds", "routing_seconds"):
+        values = [sample[metric] for sample in samples]
+        summary[metric] = {f"p{pct}": percentile(values, pct) for pct in (50, 95)}
+    for metric in ("tokens", "routing_tokens", "cost_usd"):
+        summary[f"mean_{metric}"] = sum(sample[metric] for sample in samples) / len(samples) if samples else 0.0
+    return summary
+
+
+def print_report(report):
+    header = f"{'strategy':<16} {'R@1':>5} {'R@3':>5} {'R@5':>5} {'prec':>5} {'route p50':>9} {'e2e p50':>8} " \
+             f"{'e2e p95':>8} {'tokens':>8} {'route tok':>9} {'$/query':>9}  routers"
+    print(header)
+    print("-" * len(header))
+
+    def fmt(value, width, spec=".2f"):
+        return f"{'-':>{width}}" if value is None else f"{value:>{width}{spec}}"
+
+    for name, summary in report.items():
+        print(f"{name:<16} {fmt(summary['recall@1'], 5)} {fmt(summary['recall@3'], 5)} {fmt(summary['recall@5'], 5)} "
+              f"{fmt(summary['precision'], 5)} {fmt(summary['routing_seconds']['p50'], 8, '.3f')}s "
+              f"{fmt(summary['total_seconds']['p50'], 7, '.3f')}s {fmt(summary['total_seconds']['p95'], 7, '.3f')}s "
+              f"{summary['mean_tokens']:>8.0f} {summary['mean_routing_tokens']:>9.0f} {summary['mean_cost_usd']:>9.5f}  "
+              f"{','.join(summary['routers'])} ({summary['routed']}/{summary['queries']} routed)")
+    for name, summary in report.items():
+        if summary.get("not_measured"):
+            print(f"NOTE {name}: {summary['not_measured']}; not gated.")
+
+
+def check_gates(report, gate_metric, min_score=None, baseline=None, tolerance=0.0):
+    """Failure messages for strategies below min_score, or below the baseline report by more than tolerance."""
+    failures = []
+    for name, summary in report.items():
+        value = summary[gate_metric]
+        if value is None or summary.get("not_measured"):
+            continue
+        if min_score is not None and value < min_score:
+            failures.append(f"{name}: {gate_metric} {value:.2f} is below {min_score:.2f}")
+        previous = (baseline or {}).get(name, {}).get(gate_metric)
+        if previous is not None and value < previous - tolerance:
+            failures.append(f"{name}: {gate_metric} dropped from {previous:.2f} to {value:.2f}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score file routing strategies against golden question-to-file labels.")
+    parser.add_argument("--golden", default=golden_path, help="Golden labels (JSON list of question, level, expected_files).")
+    parser.add_argument("-s", "--strategy", action="append", choices=sorted(STRATEGIES),
+                        help="Strategy to run (repeatable). Defaults to all of them.")
+    parser.add_argument("-r", "--repeats", type=int, default=1, help="Runs of each question, for latency percentiles.")
+    parser.add_argument("--metadata-dir", default=default_metadata_dir,
+                        help="Directory holding README.md, 3000_README.md and json/ to evaluate (default: the "
+                             "repository's creating_metadata/; point it at a regenerated README to compare).")
+    parser.add_argument("--source-root", help="Verilog checkout routed files resolve against "
+                                              "(default VERILOG_QA_SOURCE_ROOT; the file list is used when it is missing).")
+    parser.add_argument("--live", action="store_true", help="Call the real OpenAI API instead of the offline fake LLM.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake LLM seconds before the first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0, help="Fake LLM output speed.")
+    parser.add_argument("--gate-metric", default="recall@3", choices=[f"recall@{k}" for k in RECALL_AT] + ["precision"])
+    parser.add_argument("--min-score", type=float, help="Exit non-zero when a strategy scores below this.")
+    parser.add_argument("--baseline", help="Earlier --output report; exit non-zero when a strategy scores lower.")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="Allowed drop against --baseline.")
+    parser.add_argument("-o", "--output", help="Write the summary and every sample as JSON.")
+    args = parser.parse_args()
+
+    golden = load_golden(args.golden)
+    if not golden:
+        sys.exit(f"No golden questions in {args.golden}.")
+    strategies = args.strategy or list(STRATEGIES)
+    missing = sorted({path for name in strategies for path in unreadable_inputs(name, args.metadata_dir, args.source_root)})
+    if missing:
+        sys.exit(f"Cannot read {', '.join(missing)}; pass --metadata-dir with the README and chunk JSON to evaluate.")
+    if not args.live:
+        import fake_llm
+        fake_llm.install(args.latency, args.tokens_per_second)
+        # The fake has no rate limit; the client budget would only add waits to the latencies
+        llm_client.rate_limiter = llm_client.TokenBucket(10 ** 6, 10 ** 9)
+        # Token counts here only size prompts for the fake; an estimate is enough without the tiktoken download
+        context_packer.ALLOW_APPROXIMATE_TOKENS = True
+    # Every query reaches the (fake or real) API, so cost and latency are not those of cache hits
+    os.environ["VERILOG_QA_CACHE_BYPASS"] = "1"
+
+    report, samples = {}, []
+    for name in strategies:
+        print(f"Running {len(golden) * args.repeats} queries with the {name} strategy...")
+        strategy_samples = evaluate(name, golden, args.repeats, args.metadata_dir, args.source_root)
+        report[name] = summarize(strategy_samples, STRATEGIES[name])
+        samples += strategy_samples
+    print()
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": report, "samples": samples}, f, indent=2)
+        print(f"Report written to {args.output}.")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["summary"]
+    failures = check_gates(report, args.gate_metric, args.min_score, baseline, args.tolerance)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
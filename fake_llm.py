@@ -0,0 +1,82 @@
+import re
+import time
+
+import openai
+
+from file_router import parse_directory_summary, tokenize
+
+# Routing prompts list files as "### File: x.v" followed by "- **Path**: ..."
+SECTION_PATTERN = re.compile(r"### File: (\S+)\s*\n- \*\*Path\*\*: (\S+)\n(.*?)(?=\n### File:|\Z)", re.DOTALL)
+
+# Real bronco-zipcpu files, offered when a routing prompt carries no file sections to pick from
+CANNED_FILES = [
+    ("cpuops.v", "/Users/frankliu/Desktop/fa24/Takehome/bronco-zipcpu/rtl/core/cpuops.v", "alu arithmetic logic shift"),
+    ("pipemem.v", "/Users/frankliu/Desktop/fa24/Takehome/bronco-zipcpu/rtl/core/pipemem.v", "pipelined memory stall"),
+    ("mpyop.v", "/Users/frankliu/Desktop/fa24/Takehome/bronco-zipcpu/rtl/core/mpyop.v", "multiply multiplier"),
+    ("slowmpy.v", "/Users/frankliu/Desktop/fa24/Takehome/bronco-zipcpu/rtl/core/slowmpy.v", "slow multiplier"),
+    ("idecode.v", "/Users/frankliu/Desktop/fa24/Takehome/bronco-zipcpu/rtl/core/idecode.v", "instruction decode"),
+    ("div.v", "/Users/frankliu/Desktop/fa24/Takehome/bronco-zipcpu/rtl/core/div.v", "divide divider"),
+    ("dcache.v", "/Users/frankliu/Desktop/fa24/Takehome/bronco-zipcpu/rtl/core/dcache.v", "data cache"),
+    ("pfcache.v", "/Users/frankliu/Desktop/fa24/Takehome/bronco-zipcpu/rtl/core/pfcache.v", "prefetch instruction cache"),
+    ("memops.v", "/Users/frankliu/Desktop/fa24/Takehome/bronco-zipcpu/rtl/core/memops.v", "memory load store"),
+]
+
+
+class _Completion(dict):
+    """Mimics the openai 0.x response object: item access for usage, attribute access for choices."""
+
+    def __init__(self, text, prompt):
+        super().__init__(usage={"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4})
+        self.choices = [{"message": {"content": text}}]
+
+
+def _query(prompt):
+    match = re.search(r"Query: (.*)", prompt)
+    return match.group(1) if match else ""
+
+
+def respond(prompt, max_files=2):
+    """Deterministic reply to one of the pipeline's prompts, based only on the prompt text."""
+    query_terms = set(tokenize(_query(prompt)))
+    if "directory summaries above" in prompt:
+        directories = parse_directory_summary(prompt)
+        scored = sorted(directories, key=lambda d: -len(query_terms & set(tokenize(d + " " + directories[d]["summary"]))))
+        return "\n".join(f"Directory: {directory}" for directory in scored[:2])
+    sections = SECTION_PATTERN.findall(prompt)
+    if not sections and "Verilog files and their locations" in prompt:
+        sections = CANNED_FILES
+    if sections:
+        scored = sorted(sections, key=lambda s: -len(query_terms & set(tokenize(s[0] + " " + s[2]))))
+        lines = [f"To answer the query regarding {_query(prompt)} the relevant Verilog files along with their paths are:", ""]
+        for rank, (file_name, path, _) in enumerate(scored[:max_files], 1):
+            lines += [f"{rank}. **File: {file_name}**", f"   - **Path**: {path}", "   - **Purpose**: (fake LLM)", ""]
+        return "\n".join(lines)
+    files = sorted(set(re.findall(r"^File: (\S+)", prompt, re.MULTILINE)))
+    return f"(fake LLM) Answer drawing on {len(files)} files: " + ", ".join(files)
+
+
+def install(latency_seconds=0.2, tokens_per_second=200):
+    """Replace openai.ChatCompletion.create with an offline fake for tests and local runs.
+
+    Every call sleeps latency_seconds before its first token and then emits
+    tokens_per_second (4 characters per token); streamed calls yield the
+    reply a few words at a time. llm_client's retry, cache and streaming paths
+    run unchanged on top of it.
+    """
+    def create(model=None, messages=None, max_tokens=None, stream=False, **kwargs):
+        prompt = messages[-1]["content"]
+        text = respond(prompt)
+        delay = len(text) / 4 / tokens_per_second
+        time.sleep(latency_seconds)
+        if not stream:
+            time.sleep(delay)
+            return _Completion(text, prompt)
+
+        def chunks():
+            words = re.findall(r"\S+\s*", text)
+            for start in range(0, len(words), 4):
+                time.sleep(delay * 4 / max(len(words), 1))
+                yield {"choices": [{"delta": {"content": "".join(words[start:start + 4])}}]}
+        return chunks()
+
+    openai.ChatCompletion.create = create
@@ -0,0 +1,211 @@
+import json
+import math
+import re
+from collections import Counter, defaultdict
+
+import chunk_store
+import process_cache
+
+# Words that show up in almost every question and carry no routing signal
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "between", "by", "can", "change", "code", "contain",
+    "contains", "design", "do", "does", "explain", "file", "files", "for", "from", "give", "how",
+    "i", "implementation", "in", "is", "it", "me", "module", "of", "on", "or", "seems", "should",
+    "that", "the", "this", "to", "use", "used", "verilog", "what", "when", "where", "which", "why",
+    "with",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+
+def tokenize(text):
+    """Lowercase the text and split it into identifier-aware search terms."""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        token = token.strip("_")
+        if not token or token in STOPWORDS:
+            continue
+        terms.append(token)
+        # i_clk, cpu_new_pc, ... also match on their parts
+        if "_" in token:
+            terms.extend(part for part in token.split("_") if part and part not in STOPWORDS)
+    return terms
+
+
+def parse_readme_sections(readme_content):
+    """Split the generated README into {file_path: {"file_name", "description"}}."""
+    sections = {}
+    header_pattern = re.compile(r"^### File: (.+)$", re.MULTILINE)
+    headers = list(header_pattern.finditer(readme_content))
+    for idx, header in enumerate(headers):
+        end = headers[idx + 1].start() if idx + 1 < len(headers) else len(readme_content)
+        body = readme_content[header.end():end]
+        path_match = re.search(r"- \*\*Path\*\*: (\S+)", body)
+        if not path_match:
+            continue
+        sections[path_match.group(1)] = {
+            "file_name": header.group(1).strip(),
+            "description": body[path_match.end():].strip(),
+        }
+    return sections
+
+
+def load_chunk_corpus(chunks_json_path):
+    """Load {file_path: joined chunk text}, from the converted chunk store when it is up to date."""
+    store = chunk_store.open_store_for(chunks_json_path)
+    if store is not None:
+        try:
+            return {file_path: store.file_text(file_path) for file_path in store.files}
+        finally:
+            store.close()
+    try:
+        with open(chunks_json_path, 'r') as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Error reading {chunks_json_path}: {e}")
+        return {}
+    return {entry['file_path']: " ".join(entry['chunks']) for entry in data}
+
+
+class BM25FileRouter:
+    """In-process BM25 index mapping a query to ranked Verilog file paths."""
+
+    def __init__(self, sections, chunk_corpus=None, k1=1.5, b=0.75, name_boost=3, description_boost=2):
+        self.k1 = k1
+        self.b = b
+        self.sections = sections
+        self.paths = []
+        self.doc_lengths = []
+        self.postings = defaultdict(list)
+
+        chunk_corpus = chunk_corpus or {}
+        for file_path in list(sections) + [p for p in chunk_corpus if p not in sections]:
+            section = sections.get(file_path, {})
+            file_name = section.get("file_name") or file_path.rsplit("/", 1)[-1]
+            terms = tokenize(file_name.replace(".v", "")) * name_boost
+            terms += tokenize(section.get("description", "")) * description_boost
+            terms += tokenize(chunk_corpus.get(file_path, ""))
+            self._add_document(file_path, terms)
+
+        self.avg_doc_length = sum(self.doc_lengths) / max(len(self.doc_lengths), 1)
+        self.idf = {
+            term: math.log(1 + (len(self.paths) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def _add_document(self, file_path, terms):
+        doc_id = len(self.paths)
+        self.paths.append(file_path)
+        self.doc_lengths.append(len(terms))
+        for term, freq in Counter(terms).items():
+            self.postings[term].append((doc_id, freq))
+
+    def search(self, query, top_k=5):
+        """Return up to top_k (file_path, score) pairs, best first."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, freq in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_doc_length)
+                scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(self.paths[doc_id], score) for doc_id, score in ranked]
+
+    def route(self, query, top_k=5, min_score=5.0, min_coverage=0.5, relative_cutoff=0.5):
+        """Rank files for the query and report whether the index is confident.
+
+        Returns (ranked, confident). The index is confident when the best file
+        clears min_score and at least min_coverage of the query terms are known
+        to the index. Files scoring below relative_cutoff of the best are dropped.
+        """
+        query_terms = set(tokenize(query))
+        ranked = self.search(query, top_k=top_k)
+        if not query_terms or not ranked:
+            return [], False
+
+        coverage = sum(1 for term in query_terms if term in self.idf) / len(query_terms)
+        top_score = ranked[0][1]
+        ranked = [(path, score) for path, score in ranked if score >= relative_cutoff * top_score]
+        confident = top_score >= min_score and coverage >= min_coverage
+        return ranked, confident
+
+    def format_response(self, query, ranked, label="BM25"):
+        """Render ranked files in the same layout the LLM router is asked to produce."""
+        lines = [f"To answer the query regarding {query} the relevant Verilog files along with their paths are:\n"]
+        for idx, (file_path, score) in enumerate(ranked, start=1):
+            section = self.sections.get(file_path, {})
+            file_name = section.get("file_name") or file_path.rsplit("/", 1)[-1]
+            purpose = _first_sentence(section.get("description", ""))
+            lines.append(f"{idx}. **File: {file_name}**")
+            lines.append(f"   - **Path**: {file_path}")
+            lines.append(f"   - **Purpose**: {purpose} ({label} score {score:.2f})\n")
+        return "\n".join(lines)
+
+
+def _first_sentence(description):
+    for line in description.splitlines():
+        line = line.strip().lstrip("#*- ").strip()
+        if len(line) > 40:
+            return line.split(". ")[0].rstrip(".") + "."
+    return "See README description."
+
+
+def summarize_description(description, max_chars=600):
+    """The opening prose of a README description (headings and bullets skipped), cut to max_chars."""
+    paragraphs, current = [], []
+    for line in description.splitlines():
+        text = line.strip()
+        if not text or text.startswith("#") or text.startswith("-") or text.startswith("*"):
+            if current:
+                paragraphs.append(" ".join(current))
+                current = []
+            if paragraphs and sum(len(p) for p in paragraphs) >= max_chars // 2:
+                break
+            continue
+        current.append(text)
+    if current:
+        paragraphs.append(" ".join(current))
+    summary = " ".join(paragraphs)
+    return summary if len(summary) <= max_chars else summary[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+def parse_directory_summary(summary_content):
+    """Parse the directory summary tier into {directory: {path, files, summary}}."""
+    directories = {}
+    for block in re.split(r"^### Directory: ", summary_content, flags=re.MULTILINE)[1:]:
+        header, _, body = block.partition("\n")
+        path_match = re.search(r"^- \*\*Path\*\*: (\S+)", body, re.MULTILINE)
+        files_match = re.search(r"^- \*\*Files\*\*: (.+)$", body, re.MULTILINE)
+        summary = re.sub(r"^- \*\*(Path|Files)\*\*: .*$", "", body, flags=re.MULTILINE).strip()
+        directories[header.strip()] = {
+            "path": path_match.group(1) if path_match else None,
+            "files": [name.strip() for name in files_match.group(1).split(",")] if files_match else [],
+            "summary": summary,
+        }
+    return directories
+
+
+def build_router(readme_content, chunks_json_path=None):
+    """Build a BM25FileRouter from README text and an optional chunk JSON file."""
+    sections = parse_readme_sections(readme_content)
+    chunk_corpus = load_chunk_corpus(chunks_json_path) if chunks_json_path else {}
+    return BM25FileRouter(sections, chunk_corpus)
+
+
+def load_router(readme_path, chunks_json_path=None):
+    """Build the router for these inputs once per process, rebuilding it when either file changes."""
+    def load():
+        try:
+            with open(readme_path, 'r') as f:
+                readme_content = f.read()
+        except Exception as e:
+            print(f"Error reading {readme_path}: {e}")
+            return None
+        return build_router(readme_content, chunks_json_path)
+
+    paths = [readme_path]
+    if chunks_json_path:
+        paths += [chunks_json_path, chunk_store.store_paths(chunk_store.default_store_path(chunks_json_path))[0]]
+    return process_cache.shared.get(("router", readme_path, chunks_json_path), paths, load)
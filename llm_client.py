@@ -0,0 +1,263 @@
+import email.utils
+import os
+import random
+import threading
+import time
+
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+
+import response_cache
+import tracing
+
+openai.api_key = os.getenv("OPENAI_API_KEY")
+# openai reads OPENAI_API_BASE itself, which is how tests point it at a local stub server
+
+MODEL = "gpt-4o-mini"
+SYSTEM_PROMPT = "You are a helpful assistant with a deep understanding of Verilog and hardware design."
+MAX_TOKENS = 1024
+
+MAX_RETRIES = int(os.getenv("VERILOG_QA_MAX_RETRIES", "6"))
+BACKOFF_BASE_SECONDS = float(os.getenv("VERILOG_QA_BACKOFF_BASE", "1.0"))
+BACKOFF_CAP_SECONDS = float(os.getenv("VERILOG_QA_BACKOFF_CAP", "30.0"))
+# gpt-4o-mini tier 1 limits; one budget is shared by every thread in the process
+REQUESTS_PER_MINUTE = int(os.getenv("VERILOG_QA_RPM", "500"))
+TOKENS_PER_MINUTE = int(os.getenv("VERILOG_QA_TPM", "200000"))
+HTTP_POOL_SIZE = int(os.getenv("VERILOG_QA_HTTP_POOL", "16"))
+
+# Errors worth retrying; anything else from openai (bad request, auth, ...) fails fast
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.ServiceUnavailableError,
+    openai.error.TryAgain,
+)
+
+
+class TokenBucket:
+    """Request and token budget refilled continuously over a one-minute window.
+
+    A 429 with Retry-After calls defer(), which holds every caller until the
+    server's window reopens instead of letting each thread find out on its own.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.request_rate = requests_per_minute / 60.0
+        self.token_rate = tokens_per_minute / 60.0
+        self.request_capacity = float(requests_per_minute)
+        self.token_capacity = float(tokens_per_minute)
+        self.request_allowance = self.request_capacity
+        self.token_allowance = self.token_capacity
+        self.blocked_until = 0.0
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        self.request_allowance = min(self.request_capacity, self.request_allowance + elapsed * self.request_rate)
+        self.token_allowance = min(self.token_capacity, self.token_allowance + elapsed * self.token_rate)
+
+    def acquire(self, tokens):
+        """Block until one request and the given number of tokens fit in the budget."""
+        tokens = min(tokens, self.token_capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                now = time.monotonic()
+                if now >= self.blocked_until and self.request_allowance >= 1 and self.token_allowance >= tokens:
+                    self.request_allowance -= 1
+                    self.token_allowance -= tokens
+                    return
+                wait = max(self.blocked_until - now,
+                           (1 - self.request_allowance) / self.request_rate,
+                           (tokens - self.token_allowance) / self.token_rate)
+            time.sleep(max(wait, 0.01))
+
+    def defer(self, seconds):
+        """Hold all callers for the given number of seconds."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def estimate_tokens(content, max_tokens=MAX_TOKENS):
+    """Rough prompt size (~4 characters per token) plus the completion budget."""
+    return len(content) // 4 + max_tokens
+
+
+def _build_session(pool_size):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=2)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+rate_limiter = TokenBucket(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+# One keep-alive connection pool for every openai call in the process
+openai.requestssession = _build_session(HTTP_POOL_SIZE)
+
+
+def retry_after_seconds(error):
+    """Seconds the server asked us to wait (Retry-After / retry-after-ms), or None."""
+    headers = getattr(error, "headers", None) or {}
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def is_retryable(error):
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    if isinstance(error, openai.error.OpenAIError):
+        return (error.http_status or 0) >= 500
+    # Network errors raised below the openai wrapper
+    return isinstance(error, (requests.RequestException, ConnectionError, TimeoutError))
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, or the server's Retry-After plus a little jitter."""
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_CAP_SECONDS * 4) + random.uniform(0, BACKOFF_BASE_SECONDS)
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+def _report(report, level, message):
+    if report:
+        report(level, message)
+
+
+def _messages(content, system_prompt):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": content}
+    ]
+
+
+def _cached(content, system_prompt, use_cache, report):
+    if not use_cache or response_cache.cache_bypassed():
+        return None, None
+    cache = response_cache.get_shared_cache()
+    key = response_cache.make_key(MODEL, system_prompt, content, MAX_TOKENS)
+    cached = cache.get(key)
+    if cached is not None:
+        _report(report, "info", "Using cached API response.")
+        tracing.record_usage(cached=True)
+    return cache, (key, cached)
+
+
+def _handle_failure(error, attempt, max_retries, report):
+    """Sleep before the next attempt; returns False when the error should not be retried."""
+    if not is_retryable(error) or attempt + 1 >= max_retries:
+        _report(report, "error", f"Error during API call: {error}.")
+        return False
+    retry_after = retry_after_seconds(error)
+    if retry_after is not None:
+        rate_limiter.defer(retry_after)
+    delay = backoff_delay(attempt, retry_after)
+    _report(report, "warning", f"Error during API call: {error}. Retrying in {delay:.1f}s ({attempt + 1}/{max_retries})...")
+    time.sleep(delay)
+    return True
+
+
+def complete(content, system_prompt=SYSTEM_PROMPT, max_retries=MAX_RETRIES, use_cache=True, report=None):
+    """Blocking chat completion with caching, the shared rate limit and backoff; None on failure.
+
+    report(level, message) receives progress messages ("info", "warning", "error").
+    """
+    cache, entry = _cached(content, system_prompt, use_cache, report)
+    if entry and entry[1] is not None:
+        return entry[1]
+
+    for attempt in range(max_retries):
+        rate_limiter.acquire(estimate_tokens(content))
+        try:
+            _report(report, "info", f"Calling API... Attempt {attempt + 1}/{max_retries}")
+            completion = openai.ChatCompletion.create(
+                model=MODEL,
+                messages=_messages(content, system_prompt),
+                max_tokens=MAX_TOKENS
+            )
+            response = completion.choices[0]['message']['content'].strip()
+        except Exception as e:
+            if not _handle_failure(e, attempt, max_retries, report):
+                break
+            continue
+
+        _report(report, "info", "API call successful.")
+        usage = completion.get('usage') or {}
+        tracing.record_usage(usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+        if cache:
+            cache.put(entry[0], response, model=MODEL)
+        return response
+
+    _report(report, "error", f"Failed to process content after {max_retries} attempts.")
+    return None
+
+
+def stream(content, on_delta, system_prompt=SYSTEM_PROMPT, max_retries=MAX_RETRIES, use_cache=True,
+           report=None, count_tokens=None):
+    """Streaming chat completion; on_delta(text_so_far) is called as tokens arrive.
+
+    Retries only happen before the first token. Returns (response, first_token_seconds),
+    with response None when streaming failed so the caller can fall back to complete().
+    count_tokens(text) is used for usage accounting since streams carry no usage block.
+    """
+    cache, entry = _cached(content, system_prompt, use_cache, report)
+    if entry and entry[1] is not None:
+        on_delta(entry[1])
+        return entry[1], None
+
+    for attempt in range(max_retries):
+        rate_limiter.acquire(estimate_tokens(content))
+        start = time.perf_counter()
+        first_token_at = None
+        parts = []
+        try:
+            chunks = openai.ChatCompletion.create(
+                model=MODEL,
+                messages=_messages(content, system_prompt),
+                max_tokens=MAX_TOKENS,
+                stream=True
+            )
+            for chunk in chunks:
+                delta = chunk['choices'][0]['delta'].get('content') if chunk['choices'] else None
+                if not delta:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter() - start
+                    tracing.record_first_token(first_token_at)
+                parts.append(delta)
+                on_delta("".join(parts))
+        except Exception as e:
+            # Once tokens were shown, a retry would repeat them; let the caller fall back
+            if first_token_at is not None or not _handle_failure(e, attempt, max_retries, report):
+                _report(report, "warning", f"Streaming failed: {e}")
+                return None, first_token_at
+            continue
+
+        response = "".join(parts).strip()
+        if not response:
+            return None, first_token_at
+        if count_tokens:
+            tracing.record_usage(count_tokens(system_prompt + content), count_tokens(response))
+        if cache:
+            cache.put(entry[0], response, model=MODEL)
+        return response, first_token_at
+
+    return None, None
@@ -0,0 +1,203 @@
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import openai
+import requests
+
+import design_qa
+import llm_client
+from batch_qa import SAMPLE_QUESTIONS, flatten_questions, load_questions
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values (pct in 0-100); None when there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def in_process_runner():
+    """run(query) -> (ok, result) through design_qa.run_query in this process; failed queries carry an error."""
+    def run(query):
+        result = design_qa.run_query(query)
+        return result.get("error") is None, result
+    return run
+
+
+def service_runner(url, timeout=300):
+    """run(query) -> (ok, result) against a qa_service.py instance, one connection pool per user thread."""
+    local = threading.local()
+
+    def run(query):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        response = local.session.post(f"{url.rstrip('/')}/query", json={"query": query}, timeout=timeout)
+        result = response.json() if response.headers.get("Content-Type", "").startswith("application/json") else {}
+        result["status"] = response.status_code
+        return response.status_code == 200 and result.get("error") is None, result
+    return run
+
+
+def run_load(run, questions, users=8, requests_total=None, duration=None):
+    """Drive run() from `users` threads, each sending its next query as soon as the last returns.
+
+    Stops after requests_total queries or duration seconds, whichever comes
+    first. Returns (samples, elapsed) where each sample has the query,
+    latency, ok flag, HTTP status (service runs) and per-stage seconds.
+    """
+    questions = itertools.cycle(questions)
+    lock = threading.Lock()
+    samples = []
+    sent = [0]
+    started = time.perf_counter()
+
+    def next_query():
+        with lock:
+            if requests_total is not None and sent[0] >= requests_total:
+                return None
+            if duration is not None and time.perf_counter() - started >= duration:
+                return None
+            sent[0] += 1
+            return next(questions)["question"]
+
+    def user():
+        while True:
+            query = next_query()
+            if query is None:
+                return
+            start = time.perf_counter()
+            try:
+                ok, result = run(query)
+                error = result.get("error")
+            except Exception as e:
+                ok, result, error = False, {}, str(e)
+            sample = {
+                "query": query,
+                "seconds": time.perf_counter() - start,
+                "ok": ok,
+                "status": result.get("status"),
+                "error": error,
+                "cold": result.get("cold"),
+                "coalesced": result.get("coalesced"),
+                "stages": {stage["stage"]: stage["seconds"] for stage in result.get("stages", [])},
+            }
+            with lock:
+                samples.append(sample)
+
+    threads = [threading.Thread(target=user, name=f"user-{idx}") for idx in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, elapsed, users):
+    """Throughput and latency percentiles, overall and for each pipeline stage, of the queries that succeeded."""
+    latencies = [sample["seconds"] for sample in samples if sample["ok"]]
+    stages = {}
+    for sample in samples:
+        if not sample["ok"]:
+            continue
+        for name, seconds in sample["stages"].items():
+            stages.setdefault(name, []).append(seconds)
+    return {
+        "users": users,
+        "requests": len(samples),
+        "ok": len(latencies),
+        "failed": len(samples) - len(latencies),
+        "errors": dict(Counter(sample["error"] for sample in samples if sample["error"])),
+        "statuses": dict(Counter(sample["status"] for sample in samples if sample["status"] is not None)),
+        "coalesced": sum(1 for sample in samples if sample["coalesced"]),
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency": {f"p{pct}": percentile(latencies, pct) for pct in (50, 95, 99)},
+        "stages": {name: {f"p{pct}": percentile(values, pct) for pct in (50, 95, 99)}
+                   for name, values in stages.items()},
+    }
+
+
+def print_report(report):
+    latency = report["latency"]
+    print(f"{report['requests']} queries from {report['users']} users in {report['elapsed_seconds']:.1f}s: "
+          f"{report['ok']} ok, {report['failed']} failed, {report['throughput_rps']:.2f} queries/s")
+    for error, count in report["errors"].items():
+        print(f"  {count} x {error}")
+    if report["statuses"]:
+        print(f"HTTP statuses: {report['statuses']}, coalesced: {report['coalesced']}")
+    if latency["p50"] is not None:
+        print(f"Latency p50 {latency['p50']:.3f}s, p95 {latency['p95']:.3f}s, p99 {latency['p99']:.3f}s")
+    for name, stage in report["stages"].items():
+        print(f"  {name:<22} p50 {stage['p50']:.3f}s  p95 {stage['p95']:.3f}s  p99 {stage['p99']:.3f}s")
+    if report.get("stub"):
+        print(f"Stub server: {report['stub']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Verilog Q&A pipeline with N concurrent users.")
+    parser.add_argument("questions", nargs="?", help="Question file (.txt, .json or .jsonl). Defaults to the sample questions.")
+    parser.add_argument("-u", "--users", type=int, default=8)
+    parser.add_argument("-n", "--requests", type=int, help="Total queries to send (default: 4 per user).")
+    parser.add_argument("-d", "--duration", type=float, help="Stop sending after this many seconds.")
+    parser.add_argument("--service", help="qa_service.py URL to load instead of running design_qa in this process.")
+    parser.add_argument("--stub", action="store_true",
+                        help="Start stub_server.py in this process and point OpenAI calls at it (in-process runs).")
+    parser.add_argument("--latency", default="lognormal:0.4,0.5", help="Stub time to first token (see stub_server.py).")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--rpm", type=int, help="Client request budget per minute (default VERILOG_QA_RPM).")
+    parser.add_argument("--tpm", type=int, help="Client token budget per minute (default VERILOG_QA_TPM). "
+                                                "Full-README routing prompts use ~80K tokens each.")
+    parser.add_argument("--use-cache", action="store_true", help="Keep the response cache on (off by default so every query reaches the API).")
+    parser.add_argument("-o", "--output", help="Write every sample and the summary as JSON.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(threadName)s %(levelname)s %(message)s")
+    questions = load_questions(args.questions) if args.questions else flatten_questions(SAMPLE_QUESTIONS)
+    if not questions:
+        sys.exit("No questions to run.")
+    requests_total = args.requests if args.requests or args.duration else 4 * args.users
+
+    stub = None
+    if args.service:
+        run = service_runner(args.service)
+    else:
+        if not args.use_cache:
+            os.environ["VERILOG_QA_CACHE_BYPASS"] = "1"
+        if args.stub:
+            import stub_server
+            stub = stub_server.start(stub_server.StubConfig(args.latency, args.tokens_per_second, args.rate_limit_rate,
+                                                            args.error_rate, args.retry_after, args.seed))
+            openai.api_base = stub.api_base
+            openai.api_key = openai.api_key or "stub"
+        if args.rpm or args.tpm:
+            llm_client.rate_limiter = llm_client.TokenBucket(args.rpm or llm_client.REQUESTS_PER_MINUTE,
+                                                             args.tpm or llm_client.TOKENS_PER_MINUTE)
+        run = in_process_runner()
+
+    samples, elapsed = run_load(run, questions, args.users, requests_total, args.duration)
+    report = summarize(samples, elapsed, args.users)
+    if stub is not None:
+        report["stub"] = dict(stub.config.stats)
+        stub.shutdown()
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": report, "samples": samples}, f, indent=2)
+        print(f"Samples written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import os
+import re
+
+import process_cache
+import verilog_index
+
+# Checkout the Verilog sources are read from; set VERILOG_QA_SOURCE_ROOT when it lives elsewhere
+SOURCE_ROOT = os.getenv("VERILOG_QA_SOURCE_ROOT", "/Users/frankliu/Desktop/fa24/Takehome/bronco-zipcpu/")
+metadata_file_path = "/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/verilog_files_metadata.txt"
+
+SOURCE_EXTENSIONS = (".v", ".sv", ".vh", ".svh")
+# Anything that looks like a source file mention: bare names, relative or absolute paths, either slash
+CANDIDATE_PATTERN = re.compile(r"[\w.~/\\-]*\w\.(?:svh|sv|vh|v)(?!\w)")
+
+
+def _preference(relative_path):
+    # A bare name shared by several files resolves to the RTL copy, then the shallowest one
+    return (not relative_path.startswith("rtl/"), relative_path.count("/"), relative_path)
+
+
+def _parts(path):
+    return [part for part in path.replace("\\", "/").lower().split("/") if part and part != "."]
+
+
+class PathIndex:
+    """Resolves file mentions (bare names, relative or absolute paths) to files under a source root.
+
+    Every trailing run of path components of every file ("cpuops.v",
+    "core/cpuops.v", "rtl/core/cpuops.v") is a key of one dict, so a mention
+    resolves with at most one lookup per component of the mention, longest
+    suffix first. Matching ignores case and the slash direction, and an
+    absolute path from another checkout still resolves by its tail.
+    """
+
+    def __init__(self, relative_paths, root):
+        self.root = root
+        self.paths = sorted(set(path.replace("\\", "/") for path in relative_paths), key=_preference)
+        self.by_suffix = {}
+        for path in self.paths:
+            parts = _parts(path)
+            for idx in range(len(parts)):
+                self.by_suffix.setdefault("/".join(parts[idx:]), path)
+
+    def __len__(self):
+        return len(self.paths)
+
+    @classmethod
+    def from_directory(cls, root):
+        """Index every Verilog source under root."""
+        relative_paths = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            relative_paths += [os.path.relpath(os.path.join(dirpath, name), root)
+                               for name in filenames if name.endswith(SOURCE_EXTENSIONS)]
+        return cls(relative_paths, root)
+
+    @classmethod
+    def from_file_list(cls, metadata_path, root):
+        """Index the files listed in verilog_files_metadata.txt, re-rooted at root."""
+        paths = [vf["file_path"] for vf in verilog_index.read_file_list(metadata_path)]
+        listed_root = os.path.commonpath(paths) if len(paths) > 1 else os.path.dirname(paths[0]) if paths else ""
+        if all(path.startswith(root.rstrip("/") + "/") for path in paths):
+            listed_root = root
+        return cls([os.path.relpath(path, listed_root) for path in paths], root)
+
+    def lookup(self, mention):
+        """Path of mention relative to the root, or None."""
+        parts = _parts(mention)
+        for idx in range(len(parts)):
+            found = self.by_suffix.get("/".join(parts[idx:]))
+            if found is not None:
+                return found
+        return None
+
+    def resolve(self, mention):
+        """Absolute path of the file mention refers to, or None when it is not a known source."""
+        found = self.lookup(mention)
+        if found is None:
+            # Without an index, trust absolute paths that exist as they are
+            if not self.paths and os.path.isabs(mention) and os.path.exists(mention):
+                return mention
+            return None
+        return os.path.join(self.root, found)
+
+    def extract(self, text):
+        """Absolute paths of the known source files mentioned in text, in order of first mention."""
+        found = []
+        for match in CANDIDATE_PATTERN.finditer(text):
+            path = self.resolve(match.group(0))
+            if path and path not in found:
+                found.append(path)
+        return found
+
+
+def build_path_index(root=None, metadata_path=None):
+    """Scan root when it exists, otherwise fall back to the metadata file list (defaults: SOURCE_ROOT, metadata_file_path)."""
+    root, metadata_path = root or SOURCE_ROOT, metadata_path or metadata_file_path
+    if os.path.isdir(root):
+        return PathIndex.from_directory(root)
+    try:
+        return PathIndex.from_file_list(metadata_path, root)
+    except OSError as e:
+        print(f"Error loading file list {metadata_path}: {e}")
+        return PathIndex([], root)
+
+
+def load_path_index(root=None, metadata_path=None):
+    """Path index built once per process; rebuilt when the file list or the root directory changes."""
+    root, metadata_path = root or SOURCE_ROOT, metadata_path or metadata_file_path
+    return process_cache.shared.get(("path_index", root, metadata_path), [metadata_path, root],
+                                    lambda: build_path_index(root, metadata_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve Verilog file mentions against the source tree.")
+    parser.add_argument("mentions", nargs="+", help="File names or paths to resolve.")
+    parser.add_argument("--root", default=SOURCE_ROOT)
+    parser.add_argument("--metadata", default=metadata_file_path)
+    args = parser.parse_args()
+
+    index = build_path_index(args.root, args.metadata)
+    print(f"{len(index)} source files under {args.root}")
+    for mention in args.mentions:
+        print(f"{mention} -> {index.resolve(mention)}")
+
+
+if __name__ == "__main__":
+    main()
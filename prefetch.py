@@ -0,0 +1,105 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import context_packer
+import path_index
+import process_cache
+import tracing
+
+# Threads reading and chunking routed files while the routing response streams
+PREFETCH_WORKERS = int(os.getenv("VERILOG_QA_PREFETCH_WORKERS", "8"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """Thread pool shared by every query in the process."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        return _executor
+
+
+def load_file(file_path, model="gpt-4o-mini"):
+    """(content, prepared chunks) of a source file, both kept in the process cache until it changes."""
+    content = process_cache.shared.read_text(file_path)
+    chunks = process_cache.shared.get(("chunks", file_path, model), [file_path],
+                                      lambda: context_packer.prepare_chunks(content, model))
+    return content, chunks
+
+
+class FilePrefetcher:
+    """Reads and chunks files as their paths appear in a streaming routing response.
+
+    feed() is called with the response text so far; every file mention that
+    is followed by more text (so it is complete) and that resolve() maps to a
+    source file is loaded on the shared pool, along with related_files(path)
+    when given. collect() then
+    waits for the files the pipeline actually settled on, loading any that
+    were never seen, so the answer prompt is ready as soon as routing ends.
+    Loads that turn out not to be needed only warm the process cache.
+    """
+
+    def __init__(self, resolve=None, related_files=None, model="gpt-4o-mini"):
+        self.resolve = resolve or (lambda mention: mention)
+        self.related_files = related_files
+        self.model = model
+        self._futures = {}
+        self._scanned = 0
+        self._early = set()
+        self._trace = tracing.current_trace()
+
+    def feed(self, text):
+        """Start loading every path that has fully arrived in text."""
+        for match in path_index.CANDIDATE_PATTERN.finditer(text, self._scanned):
+            if match.end() >= len(text):
+                # May still be growing (e.g. ".v" of ".vh"); look at it again on the next delta
+                break
+            self._scanned = match.end()
+            path = self.resolve(match.group(0))
+            if path is None:
+                continue
+            started = [path]
+            if self.related_files:
+                started += self.related_files(started)
+            self._early.update(started)
+            self.submit(started)
+
+    def submit(self, file_paths):
+        for file_path in file_paths:
+            if file_path not in self._futures:
+                self._futures[file_path] = executor().submit(self._load, file_path)
+
+    def _load(self, file_path):
+        # Worker threads have no active trace of their own
+        with tracing.bind(self._trace):
+            return load_file(file_path, self.model)
+
+    def collect(self, file_paths):
+        """Wait for file_paths in order; returns (file_contents, prepared, errors).
+
+        file_contents is [(file_path, content)] of the readable, non-empty
+        files, prepared maps each of them to its chunks, and errors is
+        [(file_path, exception)] for the rest.
+        """
+        self.submit(file_paths)
+        file_contents, prepared, errors = [], {}, []
+        for file_path in file_paths:
+            try:
+                content, chunks = self._futures[file_path].result()
+            except Exception as e:
+                errors.append((file_path, e))
+                continue
+            if content:
+                file_contents.append((file_path, content))
+                prepared[file_path] = chunks
+            else:
+                errors.append((file_path, ValueError("file is empty")))
+        return file_contents, prepared, errors
+
+    def prefetched(self, file_paths):
+        """How many of file_paths were started from the streaming response, before routing finished."""
+        return sum(1 for file_path in file_paths if file_path in self._early)
@@ -0,0 +1,76 @@
+import os
+import threading
+
+import tracing
+
+
+def file_signature(paths):
+    """(path, mtime_ns, size) for each path; missing files get None so their creation is noticed too."""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+class ProcessCache:
+    """Values derived from files, kept for the life of the process and rebuilt when a source file changes.
+
+    Streamlit re-executes the app script on every interaction but keeps imported
+    modules, so a module-level instance is shared by every session and rerun.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, key, paths, loader):
+        """Return loader()'s value for key, calling it again only when one of paths changed.
+
+        Concurrent callers for the same key wait for a single load instead of
+        each building their own copy.
+        """
+        with self._key_lock(key):
+            signature = file_signature(paths)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                with self._lock:
+                    self.hits += 1
+                return entry[1]
+            value = loader()
+            self._entries[key] = (signature, value)
+            with self._lock:
+                self.loads += 1
+            tracing.record_cache_load(key)
+            return value
+
+    def read_text(self, path):
+        """File contents, re-read only after the file's mtime or size changes."""
+        def load():
+            with open(path, "r") as f:
+                return f.read()
+        return self.get(("text", path), [path], load)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "loads": self.loads}
+
+
+shared = ProcessCache()
@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import design_qa
+import tracing
+
+# Queries answered at once; each runs design_qa on its own thread
+SERVICE_WORKERS = int(os.getenv("VERILOG_QA_SERVICE_WORKERS", "8"))
+# Distinct queries allowed to wait for a worker before new ones are turned away with 503
+SERVICE_QUEUE_SIZE = int(os.getenv("VERILOG_QA_SERVICE_QUEUE", "64"))
+MAX_BODY_BYTES = 64 * 1024
+
+logger = logging.getLogger("verilog_qa.service")
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class Busy(Exception):
+    """The queue is full; the client should retry later."""
+
+
+def query_key(query):
+    """Queries that differ only in case or whitespace share one computation."""
+    return " ".join(query.lower().split())
+
+
+class QAService:
+    """Runs design_qa.run_query for many concurrent clients.
+
+    Identical queries that arrive while one is queued or running wait on the
+    same future instead of starting a second pipeline. Distinct queries wait
+    in a bounded queue for one of `workers` worker tasks; when the queue is
+    full, submit() raises Busy rather than letting work pile up.
+    """
+
+    def __init__(self, run_query=None, workers=SERVICE_WORKERS, queue_size=SERVICE_QUEUE_SIZE):
+        self.run_query = run_query or design_qa.run_query
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.inflight = {}
+        self.stats = {"received": 0, "coalesced": 0, "rejected": 0, "completed": 0, "failed": 0}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qa")
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, query):
+        """Result of run_query(query), shared with any identical query already in flight.
+
+        Returns (result, coalesced).
+        """
+        self.stats["received"] += 1
+        key = query_key(query)
+        future = self.inflight.get(key)
+        coalesced = future is not None
+        if coalesced:
+            self.stats["coalesced"] += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            try:
+                self.queue.put_nowait((query, key, future))
+            except asyncio.QueueFull:
+                self.stats["rejected"] += 1
+                raise Busy(f"{self.queue.qsize()} queries are already waiting")
+            self.inflight[key] = future
+        # shield: one client disconnecting must not cancel the answer for the others
+        return await asyncio.shield(future), coalesced
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            query, key, future = await self.queue.get()
+            try:
+                result = await loop.run_in_executor(self._executor, self.run_query, query)
+                self.stats["completed"] += 1
+                future.set_result(result)
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.exception("Query failed: %s", query)
+                future.set_exception(e)
+            finally:
+                self.inflight.pop(key, None)
+                self.queue.task_done()
+
+    def status(self):
+        return {**self.stats, "queued": self.queue.qsize(), "queue_size": self.queue.maxsize,
+                "inflight": len(self.inflight), "workers": self.workers}
+
+
+async def read_request(reader):
+    """Parse one HTTP/1.1 request; returns (method, path, headers, body) or None at end of stream."""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0"))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path.split("?")[0], headers, body
+
+
+def write_response(writer, status, payload, content_type="application/json", extra_headers=()):
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+    head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}"] + [f"{name}: {value}" for name, value in extra_headers]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+
+async def handle_request(service, method, path, body):
+    """Route one request; returns (status, payload, content_type, extra_headers)."""
+    if path == "/healthz":
+        return 200, service.status(), "application/json", ()
+    if path == "/metrics":
+        return 200, tracing.metrics.render().encode("utf-8"), "text/plain; version=0.0.4", ()
+    if path != "/query":
+        return 404, {"error": f"no route for {path}"}, "application/json", ()
+    if method != "POST":
+        return 405, {"error": "use POST"}, "application/json", (("Allow", "POST"),)
+    try:
+        query = json.loads(body or b"{}").get("query", "").strip()
+    except (ValueError, AttributeError):
+        query = ""
+    if not query:
+        return 400, {"error": 'expected a JSON body {"query": "..."}'}, "application/json", ()
+
+    start = time.perf_counter()
+    try:
+        result, coalesced = await service.submit(query)
+    except Busy as e:
+        return 503, {"error": f"busy: {e}"}, "application/json", (("Retry-After", "1"),)
+    except Exception as e:
+        return 500, {"error": str(e)}, "application/json", ()
+    return 200, {**result, "coalesced": coalesced, "service_seconds": time.perf_counter() - start}, "application/json", ()
+
+
+async def serve(host="127.0.0.1", port=8502, workers=SERVICE_WORKERS, queue_size=SERVICE_QUEUE_SIZE, run_query=None):
+    """Serve POST /query, GET /healthz and GET /metrics until cancelled."""
+    service = QAService(run_query=run_query, workers=workers, queue_size=queue_size)
+    service.start()
+
+    async def on_connection(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError) as e:
+                    write_response(writer, 413 if "too large" in str(e) else 400, {"error": str(e)})
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload, content_type, extra = await handle_request(service, method, path, body)
+                write_response(writer, status, payload, content_type, extra)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(on_connection, host, port, limit=MAX_BODY_BYTES)
+    logger.info(json.dumps({"event": "service_started", "host": host, "port": port, "workers": workers,
+                            "queue_size": queue_size}))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Verilog Q&A pipeline over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("-w", "--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("-q", "--queue-size", type=int, default=SERVICE_QUEUE_SIZE)
+    parser.add_argument("--fake-llm", action="store_true", help="Answer with fake_llm.py instead of calling OpenAI.")
+    parser.add_argument("--fake-latency", type=float, default=0.2, help="Seconds before the fake LLM's first token.")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(threadName)s %(levelname)s %(message)s")
+    if args.fake_llm:
+        import fake_llm
+        fake_llm.install(latency_seconds=args.fake_latency)
+        # Fake answers must not land in the response cache the real app and batch runs read
+        os.environ["VERILOG_QA_CACHE_BYPASS"] = "1"
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue_size))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import re
+from collections import deque
+
+import path_index
+from file_router import tokenize
+
+# Turns kept per session, and the token budget of the history replayed into the answer prompt
+MAX_TURNS = int(os.getenv("VERILOG_QA_SESSION_TURNS", "6"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("VERILOG_QA_SESSION_HISTORY_TOKENS", "1500"))
+# Share of a follow-up's terms the current files (or earlier turns) must contain to skip routing
+COVERAGE_THRESHOLD = float(os.getenv("VERILOG_QA_SESSION_COVERAGE", "0.5"))
+
+# Conversational words that say nothing about which files are needed
+FOLLOW_UP_WORDS = {
+    "about", "again", "also", "detail", "details", "more", "now", "please", "show", "tell", "then",
+    "there", "these", "those", "through", "walk", "walkthrough", "same", "instead", "case", "cases",
+    "happens", "happen", "work", "works", "mean", "means", "example", "step", "steps", "you", "my",
+}
+
+
+class QASession:
+    """One user's conversation: the files the last routing picked, their chunks, and recent turns.
+
+    A follow-up that the current files still cover is answered from them
+    directly (no routing, no re-reading), with the recent turns in the prompt.
+    Memory is bounded by one routing's files plus MAX_TURNS turns.
+    """
+
+    def __init__(self, max_turns=MAX_TURNS):
+        self.file_paths = []
+        self.file_contents = []
+        self.prepared = {}
+        self.packed = []
+        self.turns = deque(maxlen=max_turns)
+        self._file_terms = set()
+        self.reused = 0
+
+    def set_files(self, file_paths, file_contents, prepared):
+        """Replace the session's files with the ones a full pipeline run selected."""
+        self.file_paths = list(file_paths)
+        self.file_contents = list(file_contents)
+        self.prepared = dict(prepared)
+        self._file_terms = {term for _, content in file_contents for term in tokenize(content)}
+
+    def add_turn(self, query, answer, packed=None):
+        self.turns.append({"query": query, "answer": answer or ""})
+        if packed is not None:
+            self.packed = packed
+
+    def clear(self):
+        self.__init__(self.turns.maxlen)
+
+    def coverage(self, query):
+        """Share of the query's terms found in the session's files or earlier turns (1.0 for a bare "why?")."""
+        terms = {term for term in tokenize(query) if term not in FOLLOW_UP_WORDS and not term.isdigit()}
+        if not terms:
+            return 1.0
+        known = self._file_terms | {term for turn in self.turns for term in tokenize(turn["query"] + " " + turn["answer"])}
+        return len(terms & known) / len(terms)
+
+    def covers(self, query):
+        """True when the follow-up can be answered from the files already in the session."""
+        if not self.file_contents:
+            return False
+        # A file the session does not hold, named outright, always needs routing
+        mentioned = path_index.load_path_index().extract(query)
+        if any(path not in self.file_paths for path in mentioned):
+            return False
+        return self.coverage(query) >= COVERAGE_THRESHOLD
+
+    def history_prompt(self, count_tokens, token_budget=HISTORY_TOKEN_BUDGET):
+        """Most recent turns that fit token_budget, oldest first, as prompt text ("" with no turns)."""
+        kept, used = [], 0
+        for turn in reversed(self.turns):
+            text = f"Q: {turn['query']}\nA: {_shorten(turn['answer'])}"
+            tokens = count_tokens(text)
+            if used + tokens > token_budget:
+                break
+            kept.insert(0, text)
+            used += tokens
+        if not kept:
+            return ""
+        return "Conversation so far:\n\n" + "\n\n".join(kept) + "\n\n"
+
+
+def _shorten(answer, max_chars=1500):
+    """Long answers are cut at a paragraph break; the model mostly needs what was concluded."""
+    if len(answer) <= max_chars:
+        return answer
+    cut = answer.rfind("\n\n", 0, max_chars)
+    return re.sub(r"\s+$", "", answer[:cut if cut > 0 else max_chars]) + " ..."
@@ -0,0 +1,15 @@
+# The design_qa.py sample questions, importable without Streamlit or the pipeline
+SAMPLE_QUESTIONS = {
+    "easy": [
+        "Which files contain the implementation for arithmetic and logic?",
+        "Explain the interface of the pipemem module",
+    ],
+    "medium": [
+        "How does pipemem check for a stalled pipeline?",
+        "How does the design of the 3-clock multiplier change between verilator sim and synthesis?",
+    ],
+    "hard": [
+        "Give me a cycle-accurate walkthrough of the 3-clock multiplier on 8 x 3",
+        "When I use the multiplier with parameter code 4 it seems to fail on unsigned cases. Why? Give me the code to fix it."
+    ]
+}
@@ -0,0 +1,237 @@
+import argparse
+import json
+import re
+
+import process_cache
+import verilog_index
+
+# Site kinds: where a name is declared, where it is assigned, and everywhere else it is read or connected
+DECLARATION, DRIVER, USE = "decl", "driver", "use"
+
+DECLARATION_KEYWORD = re.compile(r"\b(input|output|inout|wire|reg|logic|integer|genvar|parameter|localparam)\b")
+# Left-hand side of an assignment that starts a statement: "x <=", "assign y[3:0] =", "else z ="
+ASSIGNMENT = re.compile(r"(?:^|;|\bbegin\b|\belse\b|\bassign\b|\)|:)\s*([A-Za-z_]\w*)\s*(?:\[[^\]]*\]\s*)*(?:<=|=)(?!=)")
+IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+# Sized literals (32'hffff), macros and system tasks hold identifier-like text that is not a signal
+NOT_SIGNALS = re.compile(r"\d*'[sS]?[bBoOdDhH][0-9a-fA-FxXzZ_?]+|`\w+|\$\w+|\"[^\"\n]*\"")
+TYPE_WORDS = {"signed", "unsigned", "wire", "reg", "logic", "var", "integer"}
+
+
+def _blank(match):
+    return " " * len(match.group(0))
+
+
+def parse_signals(source):
+    """{name: [[line, kind], ...]} for every signal, register, wire and parameter a file declares.
+
+    Line numbers are 1-based. A name is a driver on lines where it is the
+    target of an assignment, and a use on every other line it appears on.
+    """
+    code = NOT_SIGNALS.sub(_blank, verilog_index.strip_comments(source))
+    line_starts = [0] + [match.end() for match in re.finditer(r"\n", code)]
+
+    def line_of(offset):
+        lo, hi = 0, len(line_starts) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if line_starts[mid] <= offset:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo + 1
+
+    declared = {}
+    keywords = list(DECLARATION_KEYWORD.finditer(code))
+    for idx, keyword in enumerate(keywords):
+        end = keywords[idx + 1].start() if idx + 1 < len(keywords) else len(code)
+        segment = code[keyword.end():end]
+        # A declaration ends at ";" or at the ")" closing an ANSI port list
+        stop = re.search(r"[;)]", re.sub(r"\[[^\]]*\]", _blank, segment))
+        segment = segment[:stop.start()] if stop else segment
+        offset = keyword.end()
+        # Widths and concatenations in initializers must not split the list
+        segment = re.sub(r"\{[^{}]*\}", _blank, re.sub(r"\[[^\]]*\]", _blank, segment))
+        for item in re.finditer(r"[^,]+", segment):
+            text = item.group(0).split("=")[0]
+            for name in IDENTIFIER.finditer(text):
+                if name.group(0) not in TYPE_WORDS and name.group(0) not in verilog_index.VERILOG_KEYWORDS:
+                    declared.setdefault(name.group(0), set()).add((line_of(offset + item.start() + name.start()), DECLARATION))
+                    break
+
+    sites = {name: set(lines) for name, lines in declared.items()}
+    for line_no, line in enumerate(code.split("\n"), start=1):
+        drivers = {match.group(1) for match in ASSIGNMENT.finditer(line)}
+        for name in set(IDENTIFIER.findall(line)):
+            if name not in sites or (line_no, DECLARATION) in sites[name]:
+                continue
+            sites[name].add((line_no, DRIVER if name in drivers else USE))
+    return {name: sorted([line, kind] for line, kind in found) for name, found in sites.items()}
+
+
+class SignalIndex:
+    """Cross-reference of every declared name to its declaration, driver and use lines, per file."""
+
+    def __init__(self, files, sites):
+        self.files = files
+        # {name: [[file_id, line, kind], ...]}
+        self.sites = sites
+
+    @classmethod
+    def build(cls, verilog_files):
+        files, sites = [], {}
+        for vf in verilog_files:
+            try:
+                with open(vf["file_path"], "r") as f:
+                    source = f.read()
+            except Exception as e:
+                print(f"Error reading {vf['file_path']}: {e}")
+                continue
+            file_id = len(files)
+            files.append(vf["file_path"])
+            for name, found in parse_signals(source).items():
+                sites.setdefault(name, []).extend([file_id, line, kind] for line, kind in found)
+        return cls(files, sites)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"files": self.files, "sites": self.sites}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(data["files"], data["sites"])
+
+    def signals_in(self, query):
+        """Indexed names the query mentions.
+
+        Only identifier-shaped words count (an underscore or digit, as in
+        i_clk or cpu_new_pc, or anything in backticks), so plain English like
+        "stall" or "state" does not pull in every line that uses such a name.
+        """
+        quoted = set(re.findall(r"`([A-Za-z_]\w*)`", query))
+        found = []
+        for word in IDENTIFIER.findall(query):
+            if word in self.sites and word not in found and (word in quoted or re.search(r"[_\d]", word)):
+                found.append(word)
+        return found
+
+    def file_sites(self, file_path, content):
+        """{name: [[line, kind], ...]} of one file.
+
+        Parsed from the content actually being sent (cached until the file
+        changes), so the line numbers in a prompt always match the text even
+        when the file was edited after the index was built.
+        """
+        return process_cache.shared.get(("signal_sites", file_path), [file_path], lambda: parse_signals(content))
+
+    def defining_files(self, name, exclude=(), limit=2):
+        """Files outside exclude that declare or drive name, for names the routed files do not contain."""
+        paths = []
+        for file_id, _, kind in self.sites.get(name, []):
+            path = self.files[file_id]
+            if kind != USE and path not in exclude and path not in paths:
+                paths.append(path)
+        return paths[:limit]
+
+    def windows(self, names, file_contents, radius=3, max_sites=8):
+        """Numbered source windows around the sites of names, merged where they overlap.
+
+        file_contents is the routed [(file_path, content)]. Declarations and
+        drivers come first, then uses, at most max_sites lines per name and
+        file. A name none of those files mention is looked up in the files
+        that declare or drive it. Returns dicts with file_path, file_rank,
+        start_line, end_line, signals, priority and numbered text.
+        """
+        contents = dict(file_contents)
+        ranks = {path: rank for rank, (path, _) in enumerate(file_contents)}
+        for name in names:
+            if not any(name in self.file_sites(path, content) for path, content in file_contents):
+                for path in self.defining_files(name, exclude=contents):
+                    try:
+                        contents[path] = process_cache.shared.read_text(path)
+                        ranks[path] = len(ranks)
+                    except OSError:
+                        continue
+
+        windows = []
+        for path, content in contents.items():
+            sites = self.file_sites(path, content)
+            lines = content.splitlines()
+            spans = []
+            for name in names:
+                found = sorted(sites.get(name, []), key=lambda site: (site[1] == USE, site[0]))[:max_sites]
+                for line, kind in found:
+                    spans.append([max(line - radius, 1), min(line + radius, len(lines)), {name}, kind != USE])
+            spans.sort(key=lambda span: span[0])
+            merged = []
+            for span in spans:
+                if merged and span[0] <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], span[1])
+                    merged[-1][2] |= span[2]
+                    merged[-1][3] = merged[-1][3] or span[3]
+                else:
+                    merged.append(span)
+            for start, end, signals, defining in merged:
+                windows.append({
+                    "file_path": path,
+                    "file_rank": ranks[path],
+                    "start_line": start,
+                    "end_line": end,
+                    "signals": sorted(signals),
+                    "priority": 0 if defining else 1,
+                    "text": "\n".join(f"{number:>5}| {lines[number - 1]}" for number in range(start, end + 1)),
+                })
+        return windows
+
+
+def pack_windows(windows, token_budget, count_tokens):
+    """Fill token_budget with windows (declarations and drivers first); returns (context_text, packed)."""
+    packed, used = [], 0
+    for window in sorted(windows, key=lambda w: (w["priority"], w["file_rank"], w["start_line"])):
+        window["tokens"] = count_tokens(window["text"]) + 16  # label overhead
+        if used + window["tokens"] <= token_budget:
+            packed.append(window)
+            used += window["tokens"]
+    packed.sort(key=lambda w: (w["file_rank"], w["start_line"]))
+    sections = [
+        f"File: {w['file_path']} (lines {w['start_line']}-{w['end_line']}; {', '.join(w['signals'])})\n{w['text']}"
+        for w in packed
+    ]
+    return "\n\n".join(sections), packed
+
+
+def load_signal_index(path):
+    """Load the signal index once per process, reloading it when the file is rebuilt; None if it is missing."""
+    def load():
+        try:
+            return SignalIndex.load(path)
+        except Exception as e:
+            print(f"Error loading signal index {path}: {e}")
+            return None
+    return process_cache.shared.get(("signal_index", path), [path], load)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the signal declaration/driver/use index, or look a signal up.")
+    parser.add_argument("signals", nargs="*", help="Signals to look up in an existing index instead of building it.")
+    parser.add_argument("--metadata", default="/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/verilog_files_metadata.txt")
+    parser.add_argument("--output", default="/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/signal_index.json")
+    args = parser.parse_args()
+
+    if args.signals:
+        index = SignalIndex.load(args.output)
+        for name in args.signals:
+            print(f"{name}:")
+            for file_id, line, kind in index.sites.get(name, []):
+                print(f"  {index.files[file_id]}:{line} {kind}")
+        return
+
+    index = SignalIndex.build(verilog_index.read_file_list(args.metadata))
+    index.save(args.output)
+    site_count = sum(len(found) for found in index.sites.values())
+    print(f"Indexed {len(index.sites)} names ({site_count} sites) from {len(index.files)} files into {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fake_llm
+
+logger = logging.getLogger("verilog_qa.stub")
+
+
+def parse_latency(spec):
+    """Sampler for a latency spec, in seconds.
+
+    "fixed:0.3", "uniform:0.1,0.6", "normal:0.4,0.1" (mean, stddev) or
+    "lognormal:0.4,0.5" (median, sigma of the log). The log-normal has the
+    long right tail real API latencies show.
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(*values)
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(rng.gauss(*values), 0.0)
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: values[0] * rng.lognormvariate(0.0, values[1])
+    raise ValueError(f"Bad latency spec {spec!r}; use fixed:S, uniform:A,B, normal:MEAN,SD or lognormal:MEDIAN,SIGMA")
+
+
+class StubConfig:
+    """Latency and failure behaviour of the stub, shared by every request thread."""
+
+    def __init__(self, latency="lognormal:0.4,0.5", tokens_per_second=80.0, rate_limit_rate=0.0,
+                 error_rate=0.0, retry_after_seconds=1.0, seed=None):
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.retry_after_seconds = retry_after_seconds
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "streamed": 0, "rate_limited": 0, "errors": 0}
+
+    def draw(self):
+        """(outcome, first_token_latency) for one request: outcome is "ok", "rate_limited" or "error"."""
+        with self.lock:
+            self.stats["requests"] += 1
+            roll = self.rng.random()
+            latency = self.sample_latency(self.rng)
+            if roll < self.rate_limit_rate:
+                outcome = "rate_limited"
+            elif roll < self.rate_limit_rate + self.error_rate:
+                outcome = "error"
+            else:
+                outcome = "ok"
+            if outcome != "ok":
+                self.stats[outcome if outcome == "rate_limited" else "errors"] += 1
+            return outcome, latency
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible /v1/chat/completions, answering with fake_llm.respond()."""
+
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status, payload, headers=()):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/stats":
+            with self.server.config.lock:
+                stats = dict(self.server.config.stats)
+            self._send_json(200, {**stats, "latency": self.server.config.latency_spec})
+        else:
+            self._send_json(404, {"error": {"message": f"no route for {self.path}", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        raw = self.rfile.read(length) if length else b""
+        if not self.path.split("?")[0].endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"no route for {self.path}", "type": "invalid_request_error"}})
+            return
+        try:
+            request = json.loads(raw)
+            prompt = request["messages"][-1]["content"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            self._send_json(400, {"error": {"message": "expected a chat completion request",
+                                            "type": "invalid_request_error"}})
+            return
+
+        config = self.server.config
+        outcome, latency = config.draw()
+        if outcome == "rate_limited":
+            # Same headers the real API sends; llm_client pauses every thread until they pass
+            self._send_json(429, {"error": {"message": "Rate limit reached (injected by stub_server)",
+                                            "type": "rate_limit_error"}},
+                            headers=[("Retry-After", str(config.retry_after_seconds)),
+                                     ("retry-after-ms", str(int(config.retry_after_seconds * 1000)))])
+            return
+        time.sleep(latency)
+        if outcome == "error":
+            self._send_json(500, {"error": {"message": "Internal error (injected by stub_server)",
+                                            "type": "server_error"}})
+            return
+
+        model = request.get("model", "gpt-4o-mini")
+        text = fake_llm.respond(prompt)
+        if request.get("stream"):
+            config.count("streamed")
+            self._stream(model, text)
+            return
+        time.sleep(len(text) / 4 / config.tokens_per_second)
+        self._send_json(200, {
+            "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+                      "total_tokens": (len(prompt) + len(text)) // 4},
+        })
+
+    def _stream(self, model, text, words_per_event=4):
+        """Server-sent events, one chat.completion.chunk per few words, paced at tokens_per_second."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        completion_id = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+        words = text.split(" ")
+        pieces = [" ".join(words[i:i + words_per_event]) + (" " if i + words_per_event < len(words) else "")
+                  for i in range(0, len(words), words_per_event)]
+        deltas = [{"role": "assistant"}] + [{"content": piece} for piece in pieces] + [{}]
+        for idx, delta in enumerate(deltas):
+            if delta.get("content"):
+                time.sleep(len(delta["content"]) / 4 / self.server.config.tokens_per_second)
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": "stop" if idx == len(deltas) - 1 else None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def make_server(config=None, host="127.0.0.1", port=0):
+    """Stub server bound to host:port (0 picks a free port); server.api_base is its OpenAI base URL."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.config = config or StubConfig()
+    server.api_base = f"http://{host}:{server.server_address[1]}/v1"
+    return server
+
+
+def start(config=None, host="127.0.0.1", port=0):
+    """Serve the stub from a daemon thread; returns the server."""
+    server = make_server(config, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True, name="stub-server").start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible chat completion stub for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8601)
+    parser.add_argument("--latency", default="lognormal:0.4,0.5",
+                        help="Time to first token: fixed:S, uniform:A,B, normal:MEAN,SD or lognormal:MEDIAN,SIGMA.")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="Output speed after the first token.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with each 429.")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    config = StubConfig(args.latency, args.tokens_per_second, args.rate_limit_rate, args.error_rate,
+                        args.retry_after, args.seed)
+    server = make_server(config, args.host, args.port)
+    print(f"Stub OpenAI API on {server.api_base} (export OPENAI_API_BASE={server.api_base} OPENAI_API_KEY=stub)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
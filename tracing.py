@@ -0,0 +1,270 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# gpt-4o-mini rates from candidate_docs.md, in dollars per 1M tokens
+INPUT_COST_PER_MILLION = 0.150
+OUTPUT_COST_PER_MILLION = 0.075
+
+logger = logging.getLogger("verilog_qa.trace")
+_local = threading.local()
+
+
+def token_cost(prompt_tokens, completion_tokens):
+    """Dollar cost of a call at the gpt-4o-mini rates."""
+    return (prompt_tokens * INPUT_COST_PER_MILLION + completion_tokens * OUTPUT_COST_PER_MILLION) / 1_000_000
+
+
+class QueryTrace:
+    """Per-query record of pipeline stages, their wall time and token usage."""
+
+    def __init__(self, query):
+        self.query = query
+        self.stages = []
+        self.files = []
+        self.routed_files = []
+        self.router = None
+        self.error = None
+        self.total_seconds = None
+        self.cache_loads = []
+        self._started = time.perf_counter()
+        self._open = []
+
+    def finish(self):
+        self.total_seconds = time.perf_counter() - self._started
+
+    def totals(self):
+        return {
+            "prompt_tokens": sum(stage["prompt_tokens"] for stage in self.stages),
+            "completion_tokens": sum(stage["completion_tokens"] for stage in self.stages),
+            "cost_usd": sum(stage["cost_usd"] for stage in self.stages),
+        }
+
+    @property
+    def cold(self):
+        """True when the query had to load the README, sources or indexes from disk."""
+        return bool(self.cache_loads)
+
+    def to_dict(self):
+        return {
+            "files": self.files,
+            "routed_files": self.routed_files,
+            "router": self.router,
+            "error": self.error,
+            "total_seconds": self.total_seconds,
+            "cold": self.cold,
+            "cache_loads": len(self.cache_loads),
+            "stages": self.stages,
+            **self.totals(),
+        }
+
+
+def current_trace():
+    """The trace active on this thread, or None outside a traced query."""
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def activate(trace):
+    """Make trace the active trace for this thread for the duration of the block."""
+    previous = current_trace()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        _local.trace = previous
+        metrics.observe(trace)
+        logger.info(json.dumps({"event": "query_trace", "query": trace.query, **trace.to_dict()}))
+
+
+@contextmanager
+def bind(trace):
+    """Let a worker thread report into trace (cache loads, ...) without finishing it on exit."""
+    previous = current_trace()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage; API calls inside it add their token usage to it."""
+    trace = current_trace()
+    if trace is None:
+        yield None
+        return
+    record = {"stage": name, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+              "api_calls": 0, "cached": False, "first_token_seconds": None}
+    trace._open.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        trace._open.remove(record)
+        trace.stages.append(record)
+
+
+def record_usage(prompt_tokens=0, completion_tokens=0, cached=False):
+    """Attribute one API call's token usage to the innermost open stage."""
+    trace = current_trace()
+    if trace is None or not trace._open:
+        return
+    record = trace._open[-1]
+    record["prompt_tokens"] += prompt_tokens or 0
+    record["completion_tokens"] += completion_tokens or 0
+    record["cost_usd"] += token_cost(prompt_tokens or 0, completion_tokens or 0)
+    if cached:
+        record["cached"] = True
+    else:
+        record["api_calls"] += 1
+
+
+def record_first_token(seconds):
+    """Record time-to-first-token of a streamed call on the innermost open stage."""
+    trace = current_trace()
+    if trace is not None and trace._open and trace._open[-1]["first_token_seconds"] is None:
+        trace._open[-1]["first_token_seconds"] = seconds
+
+
+def record_cache_load(key):
+    """Note that the active query rebuilt a process-cache entry rather than reusing it."""
+    trace = current_trace()
+    if trace is not None:
+        trace.cache_loads.append(key)
+
+
+def record_files(file_paths):
+    trace = current_trace()
+    if trace is not None:
+        trace.files = list(file_paths)
+
+
+def record_router(label):
+    """Which router picked the files: BM25, vector, hybrid or llm."""
+    trace = current_trace()
+    if trace is not None:
+        trace.router = label
+
+
+def record_routed_files(file_paths):
+    """The router's picks in rank order, before related modules are added."""
+    trace = current_trace()
+    if trace is not None:
+        trace.routed_files = list(file_paths)
+
+
+def record_error(message):
+    """Mark the active query as failed (an API call or file read returned nothing)."""
+    trace = current_trace()
+    if trace is not None:
+        trace.error = message
+
+
+class MetricsRegistry:
+    """Process-wide aggregates of finished query traces, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = {"cold": 0, "warm": 0}
+        self.query_seconds = {"cold": 0.0, "warm": 0.0}
+        self.stage_seconds = {}
+        self.stage_count = {}
+        self.tokens = {}
+        self.cost = {}
+
+    def observe(self, trace):
+        with self._lock:
+            temperature = "cold" if trace.cold else "warm"
+            self.queries[temperature] += 1
+            self.query_seconds[temperature] += trace.total_seconds or 0.0
+            for stage in trace.stages:
+                name = stage["stage"]
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + stage["seconds"]
+                self.stage_count[name] = self.stage_count.get(name, 0) + 1
+                for kind in ("prompt", "completion"):
+                    key = (name, kind)
+                    self.tokens[key] = self.tokens.get(key, 0) + stage[f"{kind}_tokens"]
+                self.cost[name] = self.cost.get(name, 0.0) + stage["cost_usd"]
+
+    def render(self):
+        with self._lock:
+            lines = [
+                "# HELP verilog_qa_queries_total Queries answered by the pipeline.",
+                "# TYPE verilog_qa_queries_total counter",
+            ]
+            for temperature in ("cold", "warm"):
+                lines.append(f'verilog_qa_queries_total{{cache="{temperature}"}} {self.queries[temperature]}')
+            lines += [
+                "# HELP verilog_qa_query_seconds Wall time of whole queries, split by cold (loaded from disk) and warm.",
+                "# TYPE verilog_qa_query_seconds summary",
+            ]
+            for temperature in ("cold", "warm"):
+                lines.append(f'verilog_qa_query_seconds_sum{{cache="{temperature}"}} {self.query_seconds[temperature]}')
+                lines.append(f'verilog_qa_query_seconds_count{{cache="{temperature}"}} {self.queries[temperature]}')
+            lines += [
+                "# HELP verilog_qa_stage_seconds Wall time per pipeline stage.",
+                "# TYPE verilog_qa_stage_seconds summary",
+            ]
+            for name in sorted(self.stage_seconds):
+                lines.append(f'verilog_qa_stage_seconds_sum{{stage="{name}"}} {self.stage_seconds[name]}')
+                lines.append(f'verilog_qa_stage_seconds_count{{stage="{name}"}} {self.stage_count[name]}')
+            lines += [
+                "# HELP verilog_qa_tokens_total Tokens sent and received per stage.",
+                "# TYPE verilog_qa_tokens_total counter",
+            ]
+            for (name, kind), count in sorted(self.tokens.items()):
+                lines.append(f'verilog_qa_tokens_total{{stage="{name}",kind="{kind}"}} {count}')
+            lines += [
+                "# HELP verilog_qa_cost_dollars_total API spend per stage at gpt-4o-mini rates.",
+                "# TYPE verilog_qa_cost_dollars_total counter",
+            ]
+            for name, cost in sorted(self.cost.items()):
+                lines.append(f'verilog_qa_cost_dollars_total{{stage="{name}"}} {cost:.8f}')
+            return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host=None):
+    """Serve /metrics on host:port (or VERILOG_QA_METRICS_HOST / _PORT) from a daemon thread; once per process."""
+    global _metrics_server
+    port = port or int(os.getenv("VERILOG_QA_METRICS_PORT", "0"))
+    # Loopback by default, like qa_service and stub_server; set 0.0.0.0 to let a remote scraper in
+    host = host or os.getenv("VERILOG_QA_METRICS_HOST", "127.0.0.1")
+    if not port:
+        return None
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True, name="metrics").start()
+            logger.info(json.dumps({"event": "metrics_server_started", "host": host, "port": port}))
+    return _metrics_server
@@ -0,0 +1,257 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+import chunk_store
+import verilog_index
+
+# Marks the GPL/copyright banner every bronco-zipcpu file starts with
+LICENSE_MARKERS = ("Copyright", "GNU General Public License", "License:")
+
+# Constructs a chunk may start at; everything else stays with the construct above it
+BOUNDARY = re.compile(
+    r"^\s*(?:\w+\s*:\s*)?(module|macromodule|always_ff|always_comb|always_latch|always|initial|generate|function|task|assign)\b"
+)
+OPENERS = {"begin", "case", "casex", "casez", "fork", "generate", "function", "task"}
+CLOSERS = {"end", "endcase", "join", "join_any", "join_none", "endgenerate", "endfunction", "endtask"}
+
+# Banner paragraphs that differ per file; the rest of the banner is shared boilerplate
+FILE_SPECIFIC_FIELDS = ("Filename:", "Project:", "Purpose:")
+
+
+def split_license_header(lines):
+    """Split off the leading comment banner when it is a license header.
+
+    Returns (purpose_lines, body_start) where purpose_lines holds the banner's
+    "Purpose:" paragraph (worth keeping) and body_start is the first line
+    index after the banner.
+    """
+    idx = 0
+    while idx < len(lines) and (not lines[idx].strip() or lines[idx].lstrip().startswith("//")
+                                or lines[idx].lstrip().startswith("`default_nettype")):
+        idx += 1
+    banner = lines[:idx]
+    if not any(marker in line for line in banner for marker in LICENSE_MARKERS):
+        return [], 0
+
+    purpose, in_purpose = [], False
+    for line in banner:
+        text = line.lstrip("/ \t")
+        if text.startswith("Purpose:"):
+            in_purpose = True
+        elif in_purpose and re.match(r"(Creator|Copyright|License|Filename|Project):", text):
+            break
+        if in_purpose:
+            purpose.append(line)
+    return purpose, idx
+
+
+def header_boilerplate(banner):
+    """The shared part of a license banner, without the file's own Filename/Project/Purpose paragraphs."""
+    kept, skipping = [], False
+    for line in banner:
+        text = line.lstrip("/ \t")
+        if text.startswith(FILE_SPECIFIC_FIELDS):
+            skipping = True
+        elif skipping and re.match(r"[A-Z][\w ]*:", text):
+            skipping = False
+        if not skipping:
+            kept.append(line)
+    return "\n".join(kept).strip("\n")
+
+
+def header_id(boilerplate):
+    """Key under which identical banners are stored once; copyright years do not count as a difference."""
+    normalized = re.sub(r"\d{4}(-\d{4})?", "YYYY", re.sub(r"\s+", " ", boilerplate))
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+
+
+def _boundaries(code_lines, start, end, depth_limit):
+    """Line indexes in [start, end) where a construct starts at block depth <= depth_limit."""
+    found = []
+    depth = 0
+    for idx in range(start, end):
+        line = code_lines[idx]
+        match = BOUNDARY.match(line)
+        if match and depth <= depth_limit and idx > start:
+            found.append((idx, match.group(1)))
+        for word in re.findall(r"\b[a-z_]+\b", line):
+            if word in ("module", "macromodule", "endmodule"):
+                depth = 0
+            elif word in OPENERS:
+                depth += 1
+            elif word in CLOSERS:
+                depth = max(depth - 1, 0)
+    return found
+
+
+def _pull_up_comments(lines, code_lines, idx, floor):
+    """Move a chunk start up over the comment lines directly above it, which usually describe it."""
+    while idx - 1 > floor and lines[idx - 1].strip() and not code_lines[idx - 1].strip():
+        idx -= 1
+    return idx
+
+
+def _split_by_size(lines, start, end, max_lines):
+    """Split [start, end) into pieces of at most max_lines, preferring blank lines as cut points."""
+    pieces = []
+    while end - start > max_lines:
+        cut = start + max_lines
+        for idx in range(start + max_lines, start + max_lines // 2, -1):
+            if not lines[idx - 1].strip():
+                cut = idx
+                break
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, end))
+    return pieces
+
+
+def _segments(lines, code_lines, start, end, max_lines, depth=0):
+    """Split [start, end) at construct boundaries, descending one block level for oversized pieces."""
+    points = [start]
+    first = BOUNDARY.match(code_lines[start]) if start < end else None
+    kinds = {start: first.group(1) if first else None}
+    for idx, kind in _boundaries(code_lines, start, end, depth):
+        idx = _pull_up_comments(lines, code_lines, idx, points[-1])
+        if idx > points[-1]:
+            points.append(idx)
+            kinds[idx] = kind
+    points.append(end)
+
+    segments = []
+    for seg_start, seg_end in zip(points, points[1:]):
+        kind = kinds[seg_start]
+        if seg_end - seg_start <= max_lines:
+            segments.append((seg_start, seg_end, kind))
+        elif depth < 2:
+            inner = _segments(lines, code_lines, seg_start, seg_end, max_lines, depth + 1)
+            if inner and inner[0][2] is None:
+                inner[0] = (inner[0][0], inner[0][1], kind)
+            segments += inner
+        else:
+            segments += [(a, b, kind) for a, b in _split_by_size(lines, seg_start, seg_end, max_lines)]
+    return segments
+
+
+def chunk_source(content, target_lines=30, max_lines=60):
+    """Split Verilog source into chunks on module/always/generate/function/assign boundaries.
+
+    Small neighbouring constructs are merged up to target_lines; a construct
+    longer than max_lines is split at the boundaries nested inside it, then at
+    blank lines. The license banner is left out: its "Purpose:" paragraph
+    becomes the first chunk and the rest is returned separately so a corpus
+    can store it once. Returns (banner_lines, chunks) where each chunk has
+    1-based inclusive start_line/end_line, the kind of construct it starts
+    with, and its text.
+    """
+    lines = content.splitlines()
+    code_lines = verilog_index.strip_comments(content).splitlines()
+    purpose, body_start = split_license_header(lines)
+
+    chunks = []
+    if purpose:
+        first = lines.index(purpose[0]) + 1
+        chunks.append({"start_line": first, "end_line": first + len(purpose) - 1, "kind": "purpose",
+                       "text": "\n".join(purpose)})
+
+    merged = []
+    for start, end, kind in _segments(lines, code_lines, body_start, len(lines), max_lines):
+        if merged and end - merged[-1][0] <= target_lines:
+            merged[-1] = (merged[-1][0], end, merged[-1][2] or kind)
+        else:
+            merged.append((start, end, kind))
+
+    for start, end, kind in merged:
+        # Trim blank edges so line ranges point at code
+        while start < end and not lines[start].strip():
+            start += 1
+        while end > start and not lines[end - 1].strip():
+            end -= 1
+        if start < end:
+            chunks.append({"start_line": start + 1, "end_line": end, "kind": kind or "body",
+                           "text": "\n".join(lines[start:end])})
+    return lines[:body_start], chunks
+
+
+def chunk_files(verilog_files, target_lines=30, max_lines=60):
+    """Chunk every readable file; returns (records, headers).
+
+    Records follow the existing chunk JSON layout ({file_name, file_path,
+    chunks}) plus chunk_lines, chunk_kinds and the header_id of the file's
+    license banner; headers maps each header_id to the banner text once.
+    """
+    records, headers = [], {}
+    for vf in verilog_files:
+        try:
+            with open(vf['file_path'], 'r') as f:
+                content = f.read()
+        except Exception as e:
+            print(f"Error reading {vf['file_path']}: {e}")
+            continue
+        banner, chunks = chunk_source(content, target_lines, max_lines)
+        key = None
+        if banner:
+            boilerplate = header_boilerplate(banner)
+            key = header_id(boilerplate)
+            headers.setdefault(key, boilerplate)
+        records.append({
+            "file_name": vf['file_name'],
+            "file_path": vf['file_path'],
+            "header_id": key,
+            "chunks": [chunk["text"] for chunk in chunks],
+            "chunk_lines": [[chunk["start_line"], chunk["end_line"]] for chunk in chunks],
+            "chunk_kinds": [chunk["kind"] for chunk in chunks],
+        })
+    return records, headers
+
+
+def headers_path_for(output_path):
+    return os.path.splitext(output_path)[0] + "_headers.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk the Verilog sources on syntax boundaries.")
+    parser.add_argument("--metadata", default="/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/verilog_files_metadata.txt")
+    # The BM25 router, vector index, chunk store and token report all read this file
+    parser.add_argument("--output", default="/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/cleaned/cleaned_verilog_chunks.json")
+    parser.add_argument("--compare", help="Chunk JSON to compare total tokens against (default: the file being replaced).")
+    parser.add_argument("--target-lines", type=int, default=30)
+    parser.add_argument("--max-lines", type=int, default=60)
+    args = parser.parse_args()
+
+    # context_packer chunks through this module, so it is only needed for the report
+    import context_packer
+
+    compare = args.compare or args.output
+    previous = None
+    if os.path.exists(compare):
+        previous = sum(context_packer.count_tokens(chunk)
+                       for record in chunk_store.iter_json_array(compare) for chunk in record["chunks"])
+
+    verilog_files = verilog_index.read_file_list(args.metadata)
+    records, headers = chunk_files(verilog_files, args.target_lines, args.max_lines)
+    # A missing checkout or stale file list would otherwise replace the retrieval corpus with a partial one
+    if not records or len(records) < len(verilog_files):
+        sys.exit(f"Chunked {len(records)} of {len(verilog_files)} listed files; {args.output} was left unchanged.")
+    with open(args.output + ".tmp", "w") as f:
+        json.dump(records, f, indent=2)
+    os.replace(args.output + ".tmp", args.output)
+    with open(headers_path_for(args.output), "w") as f:
+        json.dump(headers, f, indent=2)
+
+    chunk_count = sum(len(record["chunks"]) for record in records)
+    tokens = sum(context_packer.count_tokens(chunk) for record in records for chunk in record["chunks"])
+    tokens += sum(context_packer.count_tokens(header) for header in headers.values())
+    print(f"Wrote {chunk_count} chunks from {len(records)} files to {args.output} "
+          f"({len(headers)} distinct license headers stored once).")
+    print(f"Total tokens: {tokens}")
+    if previous is not None:
+        print(f"{compare} before: {previous} tokens ({(tokens - previous) / max(previous, 1):+.1%}).")
+
+
+if __name__ == "__main__":
+    main()
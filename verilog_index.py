@@ -0,0 +1,369 @@
+import argparse
+import json
+import re
+
+import process_cache
+
+# Words that can precede "(" or an identifier in a module body but never name a module
+VERILOG_KEYWORDS = {
+    "always", "always_comb", "always_ff", "always_latch", "and", "assert", "assign", "assume", "automatic",
+    "begin", "buf", "case", "casex", "casez", "cover", "deassign", "default", "defparam", "disable", "else",
+    "end", "endcase", "endfunction", "endgenerate", "endmodule", "endtask", "for", "force", "forever",
+    "function", "generate", "genvar", "if", "initial", "inout", "input", "integer", "localparam", "logic",
+    "module", "nand", "negedge", "nor", "not", "or", "output", "parameter", "posedge", "property", "real",
+    "reg", "release", "repeat", "restrict", "return", "signed", "task", "tri", "unsigned", "while", "wire",
+    "wor", "xnor", "xor",
+}
+
+
+def strip_comments(source):
+    """Blank out comments and attributes while keeping line numbers intact."""
+    def blank(match):
+        return re.sub(r"[^\n]", " ", match.group(0))
+    source = re.sub(r"/\*.*?\*/", blank, source, flags=re.DOTALL)
+    source = re.sub(r"\(\*.*?\*\)", blank, source, flags=re.DOTALL)
+    return re.sub(r"//[^\n]*", blank, source)
+
+
+def _matching_paren(text, open_idx):
+    """Index of the parenthesis closing the one at open_idx, or -1."""
+    depth = 0
+    for idx in range(open_idx, len(text)):
+        if text[idx] == "(":
+            depth += 1
+        elif text[idx] == ")":
+            depth -= 1
+            if depth == 0:
+                return idx
+    return -1
+
+
+def _split_top_level(text, separator=","):
+    """Split on separators that are not nested inside (), [] or {}."""
+    parts, depth, current = [], 0, []
+    for char in text:
+        if char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        if char == separator and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _line_of(text, offset):
+    return text.count("\n", 0, offset) + 1
+
+
+def _parse_parameters(text, kind_default="parameter"):
+    """Parse 'parameter [range] NAME = value, ...' items into dicts."""
+    parameters, kind = [], kind_default
+    for item in _split_top_level(text):
+        item = " ".join(item.split())
+        keyword = re.match(r"(parameter|localparam)\b\s*", item)
+        if keyword:
+            kind = keyword.group(1)
+            item = item[keyword.end():]
+        match = re.match(r"(?:(?:integer|real|signed|unsigned)\s+)*(\[[^\]]*\]\s*)?([A-Za-z_]\w*)\s*=\s*(.+)$", item)
+        if match:
+            parameters.append({
+                "name": match.group(2),
+                "value": match.group(3).strip(),
+                "kind": kind,
+                "width": (match.group(1) or "").strip(),
+            })
+    return parameters
+
+
+def _parse_port_declarations(text):
+    """Parse ANSI-style port items (or body declarations) into port dicts."""
+    ports, direction, net_type, width = [], None, "", ""
+    for item in _split_top_level(text):
+        item = " ".join(item.split())
+        match = re.match(
+            r"(?:(input|output|inout)\s+)?((?:(?:wire|reg|logic|tri|wor|integer|signed|unsigned)\s+)*)"
+            r"(\[[^\]]*\]\s*)?([A-Za-z_]\w*)",
+            item,
+        )
+        if not match:
+            continue
+        if match.group(1):
+            direction = match.group(1)
+            net_type = match.group(2).strip()
+            width = (match.group(3) or "").strip()
+        elif match.group(2) or match.group(3):
+            net_type = match.group(2).strip() or net_type
+            width = (match.group(3) or "").strip()
+        ports.append({"name": match.group(4), "direction": direction, "type": net_type, "width": width})
+    return ports
+
+
+def _parse_instances(body, body_offset, text):
+    """Find 'module_name [#(...)] instance_name [range] (...) [, instance_name (...)]' instantiations."""
+    instances = []
+    pattern = re.compile(r"(?<![\w$`.])([A-Za-z_]\w*)\b\s*(#\s*\(|[A-Za-z_]\w*\s*(?:\[[^\]]*\]\s*)?\()")
+    continuation = re.compile(r"\s*,\s*([A-Za-z_]\w*)\s*(?:\[[^\]]*\]\s*)?\(")
+    pos = 0
+    while True:
+        match = pattern.search(body, pos)
+        if not match:
+            break
+        pos = match.end()
+        module_name = match.group(1)
+        if module_name in VERILOG_KEYWORDS:
+            continue
+        if match.group(2).startswith("#"):
+            close = _matching_paren(body, match.end() - 1)
+            if close < 0:
+                continue
+            rest = re.match(r"\s*([A-Za-z_]\w*)\s*(?:\[[^\]]*\]\s*)?\(", body[close + 1:])
+            if not rest:
+                continue
+            instance_name = rest.group(1)
+            pos = close + 1 + rest.end()
+        else:
+            instance_name = re.match(r"[A-Za-z_]\w*", match.group(2)).group(0)
+        if instance_name in VERILOG_KEYWORDS:
+            continue
+        start = match.start()
+        # Skip the port list, then pick up any ", u1 (...)" instances sharing the declaration
+        while True:
+            instances.append({
+                "module": module_name,
+                "instance": instance_name,
+                "line": _line_of(text, body_offset + start),
+            })
+            close = _matching_paren(body, pos - 1)
+            if close < 0:
+                break
+            pos = close + 1
+            more = continuation.match(body, pos)
+            if not more or more.group(1) in VERILOG_KEYWORDS:
+                break
+            instance_name, start, pos = more.group(1), more.start(1), more.end()
+    return instances
+
+
+def parse_verilog_source(source, file_path=None):
+    """Extract module declarations, ports, parameters and instantiations from Verilog source."""
+    text = strip_comments(source)
+    modules = []
+    for match in re.finditer(r"\b(?:module|macromodule)\s+([A-Za-z_]\w*)", text):
+        end = text.find("endmodule", match.end())
+        end = len(text) if end < 0 else end
+        cursor = match.end()
+        parameters, ports = [], []
+
+        header = re.match(r"\s*#\s*\(", text[cursor:end])
+        if header:
+            close = _matching_paren(text, cursor + header.end() - 1)
+            parameters = _parse_parameters(text[cursor + header.end():close])
+            cursor = close + 1
+
+        port_open = re.match(r"\s*\(", text[cursor:end])
+        port_names = []
+        if port_open:
+            close = _matching_paren(text, cursor + port_open.end() - 1)
+            port_text = text[cursor + port_open.end():close]
+            if re.search(r"\b(input|output|inout)\b", port_text):
+                ports = _parse_port_declarations(port_text)
+            else:
+                port_names = [name for name in re.findall(r"[A-Za-z_]\w*", port_text)]
+            cursor = close + 1
+        semicolon = text.find(";", cursor)
+        body_start = semicolon + 1 if 0 <= semicolon < end else cursor
+        body = text[body_start:end]
+
+        # Non-ANSI headers declare directions in the body
+        if port_names:
+            declared = {}
+            for decl in re.finditer(r"\b(input|output|inout)\b([^;]*);", body):
+                for port in _parse_port_declarations(decl.group(0)[:-1]):
+                    declared[port["name"]] = port
+            ports = [declared.get(name, {"name": name, "direction": None, "type": "", "width": ""})
+                     for name in port_names]
+
+        for decl in re.finditer(r"\b(parameter|localparam)\b([^;]*);", body):
+            parameters.extend(_parse_parameters(decl.group(2), kind_default=decl.group(1)))
+
+        modules.append({
+            "name": match.group(1),
+            "file_path": file_path,
+            "line": _line_of(text, match.start()),
+            "parameters": parameters,
+            "ports": ports,
+            "instances": _parse_instances(body, body_start, text),
+        })
+    return modules
+
+
+class VerilogIndex:
+    """Queryable module / port / parameter / instantiation index over the RTL tree."""
+
+    def __init__(self, modules):
+        self.modules = modules
+        self.files = {}
+        for name, module in modules.items():
+            self.files.setdefault(module["file_path"], []).append(name)
+        self._parents = {}
+        for name, module in modules.items():
+            for instance in module["instances"]:
+                self._parents.setdefault(instance["module"], set()).add(name)
+
+    def children(self, name):
+        """Modules instantiated by name that are defined in the indexed tree."""
+        module = self.modules.get(name)
+        if not module:
+            return []
+        return sorted({inst["module"] for inst in module["instances"] if inst["module"] in self.modules})
+
+    def parents(self, name):
+        """Modules that instantiate name."""
+        return sorted(self._parents.get(name, ()))
+
+    def find_modules(self, query):
+        """Module names mentioned in the query, longest first."""
+        words = set(re.findall(r"[A-Za-z_]\w*", query))
+        words |= {word[:-2] for word in re.findall(r"[A-Za-z_]\w*\.v", query)}
+        return sorted((name for name in self.modules if name in words), key=len, reverse=True)
+
+    def related_files(self, file_paths, limit=4):
+        """Files holding parents and children of the modules defined in file_paths."""
+        related = []
+        for file_path in file_paths:
+            for name in self.files.get(file_path, []):
+                for other in self.parents(name) + self.children(name):
+                    other_path = self.modules[other]["file_path"]
+                    if other_path not in file_paths and other_path not in related:
+                        related.append(other_path)
+        return related[:limit]
+
+    def describe_interface(self, name):
+        """Markdown summary of a module's parameters and ports."""
+        module = self.modules[name]
+        lines = [f"**Module `{name}`** ({module['file_path']}, line {module['line']})", ""]
+        if module["parameters"]:
+            lines.append("| Parameter | Kind | Default |")
+            lines.append("| --- | --- | --- |")
+            for param in module["parameters"]:
+                lines.append(f"| `{param['name']}` | {param['kind']} | `{param['value']}` |")
+            lines.append("")
+        lines.append("| Port | Direction | Type | Width |")
+        lines.append("| --- | --- | --- | --- |")
+        for port in module["ports"]:
+            lines.append(
+                f"| `{port['name']}` | {port['direction'] or '?'} | {port['type'] or 'wire'} | `{port['width'] or '1'}` |"
+            )
+        return "\n".join(lines)
+
+    def describe_hierarchy(self, name):
+        """Markdown summary of a module's parents and instantiated children."""
+        module = self.modules[name]
+        lines = [f"**Module `{name}`** ({module['file_path']})", ""]
+        parents = self.parents(name)
+        lines.append("Instantiated by: " + (", ".join(f"`{p}`" for p in parents) if parents else "no indexed module"))
+        lines.append("")
+        if module["instances"]:
+            lines.append("Instantiates:")
+            for inst in module["instances"]:
+                lines.append(f"- `{inst['module']}` as `{inst['instance']}` (line {inst['line']})")
+        else:
+            lines.append("Instantiates: no submodules")
+        return "\n".join(lines)
+
+    def answer(self, query):
+        """Answer interface/hierarchy questions about a named module, or return None."""
+        names = self.find_modules(query)
+        if not names:
+            return None
+        lowered = query.lower()
+        wants_interface = re.search(r"\b(interface|ports?|parameters?|inputs?|outputs?|signals? list)\b", lowered)
+        wants_hierarchy = re.search(
+            r"\b(hierarchy|instantiat\w*|parents?|child(ren)?|submodules?|used by|uses)\b", lowered
+        )
+        # Questions about behaviour ("how", "why", "walkthrough") still need the LLM
+        if re.search(r"\b(how|why|walkthrough|fix|cycle)\b", lowered) or not (wants_interface or wants_hierarchy):
+            return None
+        sections = []
+        for name in names:
+            if wants_interface:
+                sections.append(self.describe_interface(name))
+            if wants_hierarchy:
+                sections.append(self.describe_hierarchy(name))
+        return "\n\n".join(sections)
+
+    def to_dict(self):
+        return {"modules": self.modules}
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            return cls(json.load(f)["modules"])
+
+
+def _definition_rank(file_path):
+    return 1 if "/sim/" in file_path or "/bench/" in file_path else 0
+
+
+def build_index(verilog_files):
+    """Parse every {"file_name", "file_path"} entry into a VerilogIndex."""
+    modules = {}
+    for vf in verilog_files:
+        try:
+            with open(vf["file_path"], "r") as f:
+                source = f.read()
+        except Exception as e:
+            print(f"Error reading {vf['file_path']}: {e}")
+            continue
+        for module in parse_verilog_source(source, vf["file_path"]):
+            # sim/ and bench/ copies (memdev.v, iscachable.v) must not shadow the rtl/ definition
+            existing = modules.get(module["name"])
+            if existing and _definition_rank(existing["file_path"]) <= _definition_rank(module["file_path"]):
+                continue
+            modules[module["name"]] = module
+    return VerilogIndex(modules)
+
+
+def read_file_list(metadata_path):
+    """Parse verilog_files_metadata.txt lines ('File Name: x, File Path: y')."""
+    verilog_files = []
+    with open(metadata_path, "r") as f:
+        for line in f:
+            if line.strip():
+                file_name, file_path = line.replace("File Name:", "").replace("File Path:", "").split(",")
+                verilog_files.append({"file_name": file_name.strip(), "file_path": file_path.strip()})
+    return verilog_files
+
+
+def load_index(path):
+    """Load a serialized index once per process, reloading it when the file is rebuilt; None if it is missing."""
+    def load():
+        try:
+            return VerilogIndex.load(path)
+        except Exception as e:
+            print(f"Error loading Verilog index {path}: {e}")
+            return None
+    return process_cache.shared.get(("verilog_index", path), [path], load)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Verilog module/port/instantiation index.")
+    parser.add_argument("--metadata", default="/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/verilog_files_metadata.txt")
+    parser.add_argument("--output", default="/Users/frankliu/Desktop/fa24/Takehome/creating_metadata/json/verilog_index.json")
+    args = parser.parse_args()
+
+    index = build_index(read_file_list(args.metadata))
+    index.save(args.output)
+    print(f"Indexed {len(index.modules)} modules from {len(index.files)} files into {args.output}.")
+
+
+if __name__ == "__main__":
+    main()